@@ -13,8 +13,11 @@ a = Analysis(
         'utils',
         'ui.main_window',
         'ui.components', 
+        'ui.conversion_thread',
         'ui.converter_tab',
         'ui.history_tab',
+        'ui.history_model',
+        'ui.history_loader',
         'ui.settings_tab'
     ],
     hookspath=[],
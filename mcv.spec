@@ -1,13 +1,13 @@
 a = Analysis(
-    ['mcv.py'],
-    pathex=[],
+    ['src/mcv.py'],
+    pathex=['src'],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['converter', 'database', 'watcher', 'job_queue', 'scheduler'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['PyQt6'],
     noarchive=False,
     optimize=0,
 )
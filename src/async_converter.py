@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import functools
+import logging
+
+from converter import MediaConverter, ConversionResult
+from ffmpeg_runner import run_ffmpeg_async, ConversionAborted
+from stream_plan import plan_details
+
+
+class ConversionTask:
+    def __init__(self, factory):
+        self.events = asyncio.Queue()
+        self.task = asyncio.ensure_future(factory(self.events.put_nowait))
+        self.task.add_done_callback(lambda _: self.events.put_nowait(None))
+
+    def cancel(self):
+        return self.task.cancel()
+
+    def done(self):
+        return self.task.done()
+
+    def result(self):
+        return self.task.result()
+
+    def __await__(self):
+        return self.task.__await__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        info = await self.events.get()
+        if info is None:
+            # оставляем маркер, чтобы повторный обход тоже завершился
+            self.events.put_nowait(None)
+            raise StopAsyncIteration
+        return info
+
+
+class AsyncMediaConverter:
+    def __init__(self, converter=None, settings_db=None, max_concurrent=None):
+        self.converter = converter or MediaConverter(settings_db)
+        self.max_concurrent = max(1, max_concurrent or os.cpu_count() or 1)
+        self.slots = asyncio.Semaphore(self.max_concurrent)
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def ffmpeg_available(self):
+        return self.converter.ffmpeg_available
+
+    async def _execute(self, job, input_file, operation_type, progress_callback=None):
+        converter = self.converter
+        output_file = job['output_file']
+        details = plan_details(job['plan'])
+        if job['cache_key'] is not None:
+            details['cache_status'] = 'miss'
+
+        probe_info = converter.probe.cached(input_file)
+        duration = probe_info.get('duration') if probe_info else None
+        converter.logger.debug(f"Выполняемая команда: {' '.join(job['cmd'])}")
+        started = time.monotonic()
+
+        try:
+            returncode, stderr = await run_ffmpeg_async(
+                job['cmd'], duration, progress_callback, converter.stderr_lines,
+                converter._stderr_spill_path(output_file), converter.new_control())
+        except FileNotFoundError:
+            error_msg = "FFmpeg не найден. Установите FFmpeg."
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg, **details)
+        except ConversionAborted as e:
+            return converter._aborted(e, [output_file], **details)
+        except asyncio.CancelledError:
+            self.logger.info(f"Конвертация отменена: {input_file}")
+            converter._remove_partial([output_file])
+            raise
+
+        details['encode_seconds'] = time.monotonic() - started
+        return await asyncio.to_thread(
+            converter._finish_output, returncode, stderr, output_file, operation_type,
+            job['cache_key'], details)
+
+    async def convert(self, input_file, output_format, output_path=None, operation_type='video',
+                      quality=8, progress_callback=None, speed_profile=None):
+        if not os.path.isfile(input_file):
+            error_msg = f"Файл {input_file} не найден"
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg)
+
+        async with self.slots:
+            try:
+                # анализ, хэш для кэша и выдача из кэша короткие, но блокирующие
+                job = await asyncio.to_thread(
+                    self.converter._plan_job, input_file, output_format, output_path,
+                    operation_type, quality, speed_profile)
+                if job['result'] is not None:
+                    return job['result']
+                return await self._execute(job, input_file, operation_type, progress_callback)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error_msg = f"Системная ошибка: {str(e)}"
+                self.logger.error(error_msg, exc_info=True)
+                return ConversionResult(False, error_msg)
+
+    async def convert_video(self, input_file, output_format='mp4', output_path=None, quality=8,
+                            progress_callback=None, speed_profile=None):
+        return await self.convert(input_file, output_format, output_path, 'video', quality,
+                                  progress_callback, speed_profile)
+
+    async def extract_audio(self, input_file, output_format='mp3', output_path=None, quality=8,
+                            progress_callback=None):
+        return await self.convert(input_file, output_format, output_path, 'audio', quality,
+                                  progress_callback)
+
+    def start(self, input_file, output_format, output_path=None, operation_type='video',
+              quality=8, speed_profile=None):
+        return ConversionTask(lambda report: self.convert(
+            input_file, output_format, output_path, operation_type, quality, report,
+            speed_profile))
+
+    async def convert_many(self, jobs, settings_db=None, progress_callback=None):
+        async def run(job):
+            callback = None
+            if progress_callback is not None:
+                callback = functools.partial(progress_callback, job)
+            result = await self.convert(job['input_file'], job['output_format'],
+                                        job['output_path'], job['operation_type'],
+                                        job['quality'], callback, job['speed_profile'])
+            return job, result
+
+        tasks = [asyncio.ensure_future(run(self.converter._normalize_job(job)))
+                 for job in jobs]
+        try:
+            for future in asyncio.as_completed(tasks):
+                job, result = await future
+                if settings_db is not None:
+                    await asyncio.to_thread(
+                        self.converter.record_result, settings_db, job, *result,
+                        details=result.details)
+                yield job, result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,175 @@
+import os
+import time
+import socket
+import shutil
+import tempfile
+import threading
+import logging
+
+from ffmpeg_runner import run_ffmpeg, apply_threads, ConversionAborted
+from stream_plan import COPY_QUALITY_THRESHOLD
+
+
+def host_id():
+    # скорость кодирования зависит от машины: имя хоста и число ядер
+    return f"{socket.gethostname()}/{os.cpu_count() or 1}"
+
+
+def required_speed(duration=None, realtime=None, deadline=None):
+    speeds = []
+    if realtime:
+        speeds.append(float(realtime))
+    if deadline and duration:
+        speeds.append(duration / deadline)
+    return max(speeds) if speeds else None
+
+
+class AutoTuner:
+    SAMPLE_COUNT = 3
+    SAMPLE_SECONDS = 4.0
+    # кандидаты от лучшего качества к худшему: (профиль скорости, сдвиг качества)
+    LADDER = [
+        ('archival', 0),
+        ('balanced', 0),
+        ('fastest', 0),
+        ('fastest', -2),
+        ('fastest', -4),
+    ]
+
+    def __init__(self, converter, settings_db=None, host=None):
+        self.converter = converter
+        self.settings_db = settings_db
+        self.host = host or host_id()
+        self.logger = logging.getLogger(__name__)
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, quality):
+        seen = set()
+        for speed_profile, shift in self.LADDER:
+            candidate = (speed_profile, max(1, min(10, quality + shift)))
+            if candidate not in seen:
+                seen.add(candidate)
+                yield candidate
+
+    def _sample_key(self, probe_info, plan, speed_profile, quality):
+        return (self.host, probe_info.get('width') or 0, probe_info.get('height') or 0,
+                probe_info.get('video_codec') or '', plan['video'], speed_profile, quality)
+
+    def _lookup(self, key):
+        with self._lock:
+            sample = self._memory.get(key)
+        if sample is None and self.settings_db is not None:
+            sample = self.settings_db.get_encode_sample(*key)
+            if sample is not None:
+                with self._lock:
+                    self._memory[key] = sample
+        return sample
+
+    def _remember(self, key, sample):
+        with self._lock:
+            self._memory[key] = sample
+        if self.settings_db is not None:
+            self.settings_db.save_encode_sample(*key, sample['speed'], sample['bitrate'])
+
+    def _offsets(self, duration):
+        sample_seconds = min(self.SAMPLE_SECONDS, duration)
+        count = max(1, min(self.SAMPLE_COUNT, int(duration // sample_seconds)))
+        return [duration * (i + 1) / (count + 1) - sample_seconds / 2 for i in range(count)], \
+            sample_seconds
+
+    def measure(self, input_file, output_format, plan, duration, control=None):
+        offsets, sample_seconds = self._offsets(duration)
+        # у замеров свои лимиты: зависший кандидат пропускается, а время подбора
+        # не входит в max_runtime самой задачи
+        sample_control = self.converter.new_control()
+        if control is not None:
+            sample_control.threads = control.threads
+            control.linked.register(sample_control)
+        temp_dir = tempfile.mkdtemp(prefix='mcv_tune_')
+        try:
+            encoded = 0.0
+            elapsed = 0.0
+            size = 0
+            for index, offset in enumerate(offsets):
+                output_file = os.path.join(temp_dir, f"sample_{index}.{output_format}")
+                cmd = ['ffmpeg', '-ss', f"{max(0.0, offset):.3f}", '-t', f"{sample_seconds:.3f}",
+                       '-i', input_file, '-map', '0:V:0'] + plan['video_args'] + \
+                    ['-an', '-y', output_file]
+                started = time.monotonic()
+                try:
+                    returncode, stderr = run_ffmpeg(
+                        apply_threads(cmd, sample_control.threads),
+                        stderr_lines=self.converter.stderr_lines, control=sample_control)
+                except ConversionAborted as e:
+                    if e.status == 'cancelled':
+                        raise
+                    self.logger.warning(f"Пробное кодирование прервано: {e}")
+                    return None
+                if returncode != 0 or not os.path.isfile(output_file):
+                    self.logger.warning(
+                        f"Пробное кодирование не удалось: {stderr.text(5)}")
+                    return None
+                elapsed += time.monotonic() - started
+                encoded += sample_seconds
+                size += os.path.getsize(output_file)
+            return {'speed': encoded / max(elapsed, 1e-6),
+                    'bitrate': int(size * 8 / encoded)}
+        finally:
+            if control is not None:
+                control.linked.unregister(sample_control)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def tune(self, input_file, output_format, quality=8, realtime=None, deadline=None,
+             control=None):
+        probe_info = self.converter.probe.probe(input_file)
+        duration = probe_info.get('duration') if probe_info else None
+        target = required_speed(duration, realtime, deadline)
+        if not target or not duration:
+            self.logger.warning(
+                "Автоподбор невозможен: не задана цель или неизвестна длительность")
+            return None
+
+        best = fastest = None
+        for speed_profile, candidate_quality in self.candidates(quality):
+            plan = self.converter._plan_video(
+                probe_info, output_format, candidate_quality, speed_profile)
+            if plan.get('video') in (None, 'copy'):
+                if candidate_quality >= COPY_QUALITY_THRESHOLD:
+                    self.logger.info("Видео копируется без перекодирования, автоподбор не нужен")
+                    return None
+                continue
+
+            key = self._sample_key(probe_info, plan, speed_profile, candidate_quality)
+            sample = self._lookup(key)
+            if sample is None:
+                sample = self.measure(input_file, output_format, plan, duration, control)
+                if sample is None:
+                    continue
+                self._remember(key, sample)
+                source = "замер"
+            else:
+                source = "кэш"
+
+            self.logger.info(
+                f"Кандидат {speed_profile}/{candidate_quality}: скорость {sample['speed']:.2f}x, "
+                f"битрейт {sample['bitrate'] // 1000}k ({source})")
+            result = {'speed_profile': speed_profile, 'quality': candidate_quality,
+                      'speed': sample['speed'], 'bitrate': sample['bitrate'],
+                      'target_speed': target}
+            if sample['speed'] >= target:
+                best = result
+                break
+            if fastest is None or result['speed'] > fastest['speed']:
+                fastest = result
+
+        if best is None and fastest is not None:
+            self.logger.warning(
+                f"Ни один вариант не достигает скорости {target:.2f}x, выбран самый быстрый")
+            best = fastest
+
+        if best is not None:
+            self.logger.info(
+                f"Автоподбор для {input_file}: профиль {best['speed_profile']}, "
+                f"качество {best['quality']} ({best['speed']:.2f}x при цели {target:.2f}x)")
+        return best
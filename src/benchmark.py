@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+
+VIDEO_FORMATS = ['mp4', 'avi', 'mkv', 'mov', 'webm', 'flv', 'wmv']
+AUDIO_FORMATS = ['mp3', 'wav', 'aac', 'flac', 'ogg', 'm4a']
+DEFAULT_RESOLUTIONS = ['640x360', '1280x720', '1920x1080']
+DEFAULT_DURATIONS = [5, 20]
+DEFAULT_QUALITIES = [3, 6, 9]
+FRAME_RATE = 30
+# допустимое замедление или рост размера относительно базового прогона, в процентах
+DEFAULT_THRESHOLD = 10.0
+# разница меньше этой считается шумом измерения, в секундах
+MIN_WALL_DIFFERENCE = 0.05
+
+
+def _split(value, convert=str):
+    return [convert(item) for item in value.split(',') if item.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='benchmark',
+        description="Воспроизводимый замер скорости конвертации на синтетических файлах")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Сгенерировать входные файлы и замерить конвертации")
+    run.add_argument('--output', help="Файл для результатов в JSON (по умолчанию stdout)")
+    run.add_argument('--resolutions', type=_split, default=DEFAULT_RESOLUTIONS,
+                     help="Разрешения через запятую (по умолчанию 640x360,1280x720,1920x1080)")
+    run.add_argument('--durations', type=lambda value: _split(value, float),
+                     default=DEFAULT_DURATIONS,
+                     help="Длительности в секундах через запятую (по умолчанию 5,20)")
+    run.add_argument('--formats', type=_split, default=VIDEO_FORMATS + AUDIO_FORMATS,
+                     help="Выходные форматы через запятую (по умолчанию все поддерживаемые)")
+    run.add_argument('--qualities', type=lambda value: _split(value, int),
+                     default=DEFAULT_QUALITIES,
+                     help="Уровни качества через запятую (по умолчанию 3,6,9)")
+    run.add_argument('--speed', dest='speed_profile',
+                     help="Профиль скорости кодирования (по умолчанию balanced)")
+    run.add_argument('--repeat', type=int, default=1,
+                     help="Число повторов каждого замера, берется медиана (по умолчанию 1)")
+    run.add_argument('--work-dir', help="Папка для входных и выходных файлов "
+                                        "(по умолчанию временная, удаляется после замера)")
+
+    compare = commands.add_parser('compare', help="Сравнить результаты с базовым прогоном")
+    compare.add_argument('baseline', help="Базовые результаты (JSON)")
+    compare.add_argument('current', help="Новые результаты (JSON)")
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                         help="Допустимое ухудшение в процентах (по умолчанию 10)")
+    return parser
+
+
+def generate_input(path, resolution, duration):
+    # testsrc2 и sine детерминированы, а bitexact и один поток дают побайтно одинаковый файл
+    cmd = ['ffmpeg', '-v', 'error', '-nostdin',
+           '-f', 'lavfi', '-i', f"testsrc2=size={resolution}:rate={FRAME_RATE}:duration={duration}",
+           '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+           '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18', '-pix_fmt', 'yuv420p',
+           '-threads', '1', '-c:a', 'aac', '-b:a', '192k',
+           '-fflags', '+bitexact', '-flags:v', '+bitexact', '-flags:a', '+bitexact',
+           '-shortest', '-y', path]
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
+
+
+def measure(converter, input_file, output_format, quality, output_dir, speed_profile=None):
+    started = time.monotonic()
+    if output_format in AUDIO_FORMATS:
+        result = converter.extract_audio(input_file, output_format, output_dir, quality)
+    else:
+        result = converter.convert_video(input_file, output_format, output_dir, quality,
+                                         speed_profile=speed_profile)
+    wall = time.monotonic() - started
+
+    output_file = converter.get_output_file(input_file, output_format, output_dir)
+    size = os.path.getsize(output_file) if result.success and os.path.isfile(output_file) \
+        else None
+    if os.path.isfile(output_file):
+        os.remove(output_file)
+    return result, wall, size
+
+
+def run_benchmark(args):
+    from converter import MediaConverter
+
+    converter = MediaConverter()
+    if not converter.ffmpeg_available:
+        print("FFmpeg не найден. Установите FFmpeg.", file=sys.stderr)
+        return None
+
+    if args.work_dir:
+        work_dir = args.work_dir
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        work_dir = tempfile.mkdtemp(prefix='mcv_benchmark_')
+    output_dir = os.path.join(work_dir, 'out')
+
+    results = []
+    try:
+        for resolution in args.resolutions:
+            for duration in args.durations:
+                name = f"{resolution}-{duration:g}s"
+                input_file = os.path.join(work_dir, f"{name}.mkv")
+                if not os.path.isfile(input_file):
+                    print(f"Генерация {name}", file=sys.stderr)
+                    generate_input(input_file, resolution, duration)
+
+                for output_format in args.formats:
+                    for quality in args.qualities:
+                        case = f"{name}/{output_format}/q{quality}"
+                        walls = []
+                        result = size = None
+                        for _ in range(max(1, args.repeat)):
+                            result, wall, size = measure(converter, input_file, output_format,
+                                                         quality, output_dir,
+                                                         args.speed_profile)
+                            walls.append(wall)
+                        wall = statistics.median(walls)
+
+                        record = {
+                            'case': case,
+                            'resolution': resolution,
+                            'duration': duration,
+                            'format': output_format,
+                            'quality': quality,
+                            'success': result.success,
+                            'mode': result.details.get('conversion_mode'),
+                            'wall_seconds': round(wall, 4),
+                            'speed': round(duration / wall, 3) if wall else None,
+                            'fps': round(duration * FRAME_RATE / wall, 2)
+                            if wall and output_format in VIDEO_FORMATS else None,
+                            'output_size': size,
+                        }
+                        if not result.success:
+                            record['message'] = result.message[:500]
+                        results.append(record)
+                        print(f"{case}: {record['wall_seconds']} с, {record['speed']}x",
+                              file=sys.stderr)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(),
+            'host': socket.gethostname(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'ffmpeg': converter.ffmpeg_version,
+            'speed_profile': converter.get_speed_profile(args.speed_profile),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    previous = {record['case']: record for record in baseline['results']}
+    limit = 1 + threshold / 100
+    report = []
+
+    for record in current['results']:
+        base = previous.get(record['case'])
+        if base is None:
+            continue
+        issues = []
+        if base['success'] and not record['success']:
+            issues.append('failed')
+        if base['wall_seconds'] and record['wall_seconds'] > base['wall_seconds'] * limit \
+                and record['wall_seconds'] - base['wall_seconds'] > MIN_WALL_DIFFERENCE:
+            issues.append('slower')
+        if base['output_size'] and record['output_size'] \
+                and record['output_size'] > base['output_size'] * limit:
+            issues.append('larger')
+        report.append({
+            'case': record['case'],
+            'wall_change': round((record['wall_seconds'] / base['wall_seconds'] - 1) * 100, 1)
+            if base['wall_seconds'] else None,
+            'size_change': round((record['output_size'] / base['output_size'] - 1) * 100, 1)
+            if base['output_size'] and record['output_size'] else None,
+            'regressions': issues,
+        })
+    return report
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        if baseline['meta'].get('ffmpeg') != current['meta'].get('ffmpeg') \
+                or baseline['meta'].get('host') != current['meta'].get('host'):
+            print("Внимание: результаты получены на разных машинах или версиях FFmpeg",
+                  file=sys.stderr)
+
+        report = compare_results(baseline, current, args.threshold)
+        regressions = [item for item in report if item['regressions']]
+        for item in report:
+            print(json.dumps(item, ensure_ascii=False))
+        print(f"Сравнено замеров: {len(report)}, регрессий: {len(regressions)}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    data = run_benchmark(args)
+    if data is None:
+        return 2
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import os
+import shutil
+import subprocess
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+FORMAT_MUXERS = {
+    'mp4': 'mp4',
+    'avi': 'avi',
+    'mkv': 'matroska',
+    'mov': 'mov',
+    'webm': 'webm',
+    'flv': 'flv',
+    'wmv': 'asf',
+    'mp3': 'mp3',
+    'wav': 'wav',
+    'aac': 'adts',
+    'flac': 'flac',
+    'ogg': 'ogg',
+    'm4a': 'ipod',
+}
+
+
+def _table_rows(output, separator):
+    lines = output.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().startswith(separator):
+            return lines[i + 1:]
+    return lines
+
+
+def parse_encoders(output):
+    encoders = {}
+    for line in _table_rows(output, '------'):
+        parts = line.split(None, 2)
+        if len(parts) < 2 or len(parts[0]) != 6:
+            continue
+        kind = {'V': 'video', 'A': 'audio', 'S': 'subtitle'}.get(parts[0][0])
+        if kind:
+            encoders[parts[1]] = kind
+    return encoders
+
+
+def parse_muxers(output):
+    muxers = set()
+    for line in _table_rows(output, '--'):
+        parts = line.split(None, 2)
+        if len(parts) < 2 or 'E' not in parts[0]:
+            continue
+        muxers.update(parts[1].split(','))
+    return muxers
+
+
+def parse_hwaccels(output):
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    if lines and lines[0].endswith(':'):
+        lines = lines[1:]
+    return lines
+
+
+class FFmpegCapabilities:
+    _memory = {}
+    _lock = threading.Lock()
+
+    def __init__(self, settings_db=None, ffmpeg_path=None):
+        self.settings_db = settings_db
+        self.path = ffmpeg_path or shutil.which("ffmpeg")
+        self.logger = logging.getLogger(__name__)
+        self.data = self._load()
+
+    @property
+    def available(self):
+        return self.data is not None
+
+    @property
+    def version_text(self):
+        return self.data['version'] if self.data else ""
+
+    @property
+    def version_line(self):
+        return self.version_text.splitlines()[0] if self.version_text else None
+
+    @property
+    def encoders(self):
+        return self.data['encoders'] if self.data else {}
+
+    @property
+    def muxers(self):
+        return set(self.data['muxers']) if self.data else set()
+
+    @property
+    def hwaccels(self):
+        return self.data['hwaccels'] if self.data else []
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_muxer(self, name):
+        return name in self.muxers
+
+    def _key(self):
+        if self.path is None:
+            return None
+        try:
+            real_path = os.path.realpath(self.path)
+            return real_path, os.stat(real_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        key = self._key()
+        if key is None:
+            self.logger.error("FFmpeg не найден в системе")
+            return None
+
+        with self._lock:
+            data = self._memory.get(key)
+        if data is not None:
+            return data
+
+        if self.settings_db is not None:
+            data = self.settings_db.get_ffmpeg_capabilities(*key)
+            if data is not None:
+                self.logger.debug("Возможности FFmpeg загружены из базы")
+
+        if data is None:
+            data = self._detect()
+            if data is not None and self.settings_db is not None:
+                self.settings_db.save_ffmpeg_capabilities(key[0], key[1], data)
+
+        if data is not None:
+            with self._lock:
+                self._memory[key] = data
+        return data
+
+    def _run(self, *args):
+        result = subprocess.run(
+            [self.path, '-hide_banner', *args], capture_output=True, text=True,
+            encoding='utf-8', errors='ignore', check=True)
+        return result.stdout
+
+    def _detect(self):
+        try:
+            version = subprocess.run(
+                [self.path, '-version'], capture_output=True, text=True,
+                encoding='utf-8', errors='ignore', check=True).stdout
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                encoders = executor.submit(self._run, '-encoders')
+                muxers = executor.submit(self._run, '-muxers')
+                hwaccels = executor.submit(self._run, '-hwaccels')
+                return {
+                    'version': version,
+                    'encoders': parse_encoders(encoders.result()),
+                    'muxers': sorted(parse_muxers(muxers.result())),
+                    'hwaccels': parse_hwaccels(hwaccels.result()),
+                }
+        except subprocess.CalledProcessError as e:
+            self.logger.error(f"Ошибка проверки FFmpeg: {e}")
+            return None
+        except Exception as e:
+            self.logger.error(f"Неожиданная ошибка при проверке FFmpeg: {e}")
+            return None
+
+    def check(self, output_format, encoders=()):
+        if not self.available:
+            return "FFmpeg не найден. Установите FFmpeg."
+
+        muxer = FORMAT_MUXERS.get(output_format, output_format)
+        if not self.has_muxer(muxer):
+            return f"Установленный FFmpeg не поддерживает формат {output_format} (muxer {muxer})"
+
+        for encoder in encoders:
+            if encoder and encoder != 'copy' and not self.has_encoder(encoder):
+                return f"Установленный FFmpeg собран без кодировщика {encoder}"
+        return None
+
+    def summary(self):
+        if not self.available:
+            return ""
+        interesting = ['libx264', 'libx265', 'libvpx-vp9', 'libsvtav1', 'libaom-av1',
+                       'aac', 'libmp3lame', 'libopus', 'libvorbis', 'flac']
+        encoders = [name for name in interesting if self.has_encoder(name)]
+        lines = [self.version_line or "",
+                 f"Кодировщики: {', '.join(encoders) or 'нет'}",
+                 f"Аппаратное ускорение: {', '.join(self.hwaccels) or 'нет'}"]
+        return '\n'.join(lines)
@@ -0,0 +1,924 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils import get_file_size
+from ffmpeg_runner import (run_ffmpeg, apply_threads, JobControl, ControlRegistry,
+                           ConversionAborted)
+from probe import MediaProbe
+from stream_plan import (plan_video, plan_audio, plan_target, plan_details, target_bitrates,
+                         describe_plan, SPEED_PROFILES, DEFAULT_SPEED_PROFILE, MIN_VIDEO_BITRATE)
+from result_cache import ConversionCache
+from capabilities import FFmpegCapabilities
+from scheduler import estimate_cost
+from autotune import AutoTuner
+
+
+class ConversionResult(tuple):
+    def __new__(cls, success, message, **details):
+        result = super().__new__(cls, (success, message))
+        result.details = details
+        return result
+
+    @property
+    def success(self):
+        return self[0]
+
+    @property
+    def message(self):
+        return self[1]
+
+
+class MediaConverter:
+    MESSAGES = {
+        'video': ("Конвертация успешно завершена", "Ошибка конвертации"),
+        'audio': ("Аудио извлечено успешно", "Ошибка извлечения аудио"),
+    }
+    SEGMENT_MIN_SECONDS = 60
+    SEGMENT_MAX_COUNT = 32
+    # сколько раз второй проход повторяется со сниженным битрейтом, если файл вышел больше цели
+    TARGET_SIZE_ATTEMPTS = 3
+    # запас при пересчете битрейта после перелета
+    TARGET_SIZE_MARGIN = 0.01
+
+    def __init__(self, settings_db=None, stderr_lines=100, stderr_log_dir=None, stall_timeout=120,
+                 max_runtime=None, scheduler=None, speed_profile=DEFAULT_SPEED_PROFILE):
+        self.settings_db = settings_db
+        self.scheduler = scheduler
+        self.speed_profile = speed_profile
+        self.stall_timeout = stall_timeout
+        self.max_runtime = max_runtime
+        self.probe = MediaProbe(settings_db)
+        self.cache = ConversionCache(
+            settings_db) if settings_db is not None else None
+        self.capabilities = FFmpegCapabilities(settings_db)
+        self.tuner = AutoTuner(self, settings_db)
+        self.ffmpeg_version = None
+        self.stderr_lines = stderr_lines
+        self.stderr_message_lines = 20
+        self.stderr_log_dir = stderr_log_dir
+        self.supported_video_formats = [
+            'mp4', 'avi', 'mkv', 'mov', 'webm', 'flv', 'wmv']
+        self.supported_audio_formats = [
+            'mp3', 'wav', 'aac', 'flac', 'ogg', 'm4a']
+        self.logger = logging.getLogger(__name__)
+        self.ffmpeg_available = self._check_ffmpeg()
+
+    def _check_ffmpeg(self):
+        if not self.capabilities.available:
+            return False
+        self.ffmpeg_version = self.capabilities.version_line
+        self.logger.info(
+            f"FFmpeg доступен: {self.ffmpeg_version or 'Неизвестная версия'}")
+        return True
+
+    def _preflight(self, output_format, plan):
+        error_msg = self.capabilities.check(
+            output_format, [plan.get('video'), plan.get('audio')])
+        if error_msg:
+            self.logger.error(error_msg)
+        return error_msg
+
+    def _stderr_spill_path(self, output_file):
+        if not self.stderr_log_dir:
+            return None
+        os.makedirs(self.stderr_log_dir, exist_ok=True)
+        return os.path.join(self.stderr_log_dir, f"{os.path.basename(output_file)}.ffmpeg.log")
+
+    def new_control(self):
+        stall_timeout, max_runtime = self.stall_timeout, self.max_runtime
+        if self.settings_db is not None:
+            stall_timeout = self.settings_db.get_int("stall_timeout", stall_timeout)
+            max_runtime = self.settings_db.get_int("max_runtime", max_runtime)
+        return JobControl(stall_timeout, max_runtime)
+
+    def get_speed_profile(self, speed_profile=None):
+        if speed_profile is None and self.settings_db is not None:
+            speed_profile = self.settings_db.get_value("speed_profile", None)
+        if speed_profile is None:
+            speed_profile = self.speed_profile
+        if speed_profile not in SPEED_PROFILES:
+            self.logger.warning(
+                f"Неизвестный профиль скорости {speed_profile}, используется {DEFAULT_SPEED_PROFILE}")
+            speed_profile = DEFAULT_SPEED_PROFILE
+        return speed_profile
+
+    def _plan_video(self, probe_info, output_format, quality, speed_profile=None):
+        return plan_video(probe_info, output_format, quality,
+                          self.get_speed_profile(speed_profile), self.capabilities.encoders)
+
+    def _run_ffmpeg(self, cmd, input_file, output_file, progress_callback=None, control=None):
+        control = control or self.new_control()
+        return run_ffmpeg(apply_threads(cmd, control.threads), self.probe.get_duration(input_file),
+                          progress_callback, self.stderr_lines,
+                          self._stderr_spill_path(output_file), control)
+
+    def _remove_partial(self, output_files):
+        for output_file in output_files:
+            try:
+                os.remove(output_file)
+                self.logger.info(f"Удален незавершенный файл: {output_file}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.warning(
+                    f"Не удалось удалить незавершенный файл {output_file}: {e}")
+
+    def _aborted(self, error, output_files, **details):
+        self.logger.warning(error.reason)
+        self._remove_partial(output_files)
+        return ConversionResult(False, error.reason, aborted=error.status, **details)
+
+    def _log_ffmpeg_errors(self, stderr):
+        for line in stderr.tail(10):
+            self.logger.error(f"FFmpeg: {line}")
+        if stderr.spill_path:
+            self.logger.error(f"Полный вывод FFmpeg: {stderr.spill_path}")
+
+    def get_output_file(self, input_file, output_format, output_path=None):
+        if output_path is None:
+            output_path = os.path.dirname(input_file)
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        return os.path.join(output_path, f"{base_name}.{output_format}")
+
+    def estimate_cost(self, input_file, output_format, operation_type='video', quality=8,
+                      speed_profile=None):
+        if operation_type != 'video' or not os.path.isfile(input_file):
+            return estimate_cost(None, operation_type)
+        probe_info = self.probe.probe(input_file)
+        plan = self._plan_video(probe_info, output_format, quality, speed_profile)
+        return estimate_cost(probe_info, operation_type, plan.get('video'))
+
+    def convert(self, input_file, output_format, output_path=None, operation_type='video', quality=8,
+                progress_callback=None, segmented=False, target_size=None, target_bitrate=None,
+                control=None, speed_profile=None, realtime=None, deadline=None):
+        if self.scheduler is None:
+            return self._convert(input_file, output_format, output_path, operation_type, quality,
+                                 progress_callback, segmented, target_size, target_bitrate,
+                                 control, speed_profile, realtime, deadline)
+
+        control = control or self.new_control()
+        admission = self.scheduler.admit(
+            self.estimate_cost(input_file, output_format, operation_type, quality, speed_profile),
+            control)
+        if admission is None:
+            return self._aborted(ConversionAborted(control.status, control.reason), [])
+        control.threads = admission.threads
+        try:
+            return self._convert(input_file, output_format, output_path, operation_type, quality,
+                                 progress_callback, segmented, target_size, target_bitrate,
+                                 control, speed_profile, realtime, deadline)
+        finally:
+            admission.release()
+
+    def _convert(self, input_file, output_format, output_path, operation_type, quality,
+                 progress_callback, segmented, target_size, target_bitrate, control,
+                 speed_profile, realtime=None, deadline=None):
+        if operation_type == 'video' and (target_size or target_bitrate):
+            return self.convert_video_target(input_file, output_format, output_path, target_size,
+                                             target_bitrate, progress_callback, control,
+                                             speed_profile)
+
+        tuned = None
+        if operation_type == 'video' and (realtime or deadline) and os.path.isfile(input_file):
+            control = control or self.new_control()
+            try:
+                tuned = self.tuner.tune(input_file, output_format, quality, realtime, deadline,
+                                        control)
+            except ConversionAborted as e:
+                return self._aborted(e, [])
+            if tuned is not None:
+                quality, speed_profile = tuned['quality'], tuned['speed_profile']
+
+        if operation_type == 'video' and segmented:
+            result = self.convert_video_segmented(input_file, output_format, output_path, quality,
+                                                  progress_callback, control=control,
+                                                  speed_profile=speed_profile)
+        elif operation_type == 'video':
+            result = self.convert_video(input_file, output_format, output_path, quality,
+                                        progress_callback, control, speed_profile)
+        else:
+            return self.extract_audio(input_file, output_format, output_path, quality,
+                                      progress_callback, control)
+
+        if tuned is not None:
+            # в историю попадает подобранное качество, а не запрошенное
+            result.details['quality'] = quality
+        return result
+
+    def _normalize_job(self, job):
+        operation_type = job.get('operation_type', 'video')
+        default_format = 'mp4' if operation_type == 'video' else 'mp3'
+        return {
+            'input_file': job['input_file'],
+            'output_format': job.get('output_format') or default_format,
+            'output_path': job.get('output_path'),
+            'operation_type': operation_type,
+            'quality': job.get('quality', 8),
+            'segmented': job.get('segmented', False),
+            'target_size': job.get('target_size'),
+            'target_bitrate': job.get('target_bitrate'),
+            'speed_profile': job.get('speed_profile'),
+            'realtime': job.get('realtime'),
+            'deadline': job.get('deadline'),
+        }
+
+    def _run_job(self, job, progress_callback=None, controls=None, control=None):
+        callback = None
+        if progress_callback is not None:
+            callback = functools.partial(progress_callback, job)
+
+        if control is None:
+            control = self.new_control()
+        if controls is not None:
+            controls.register(control)
+        try:
+            return self.convert(job['input_file'], job['output_format'], job['output_path'],
+                                job['operation_type'], job['quality'], callback, job['segmented'],
+                                job['target_size'], job['target_bitrate'], control=control,
+                                speed_profile=job['speed_profile'], realtime=job['realtime'],
+                                deadline=job['deadline'])
+        except Exception as e:
+            error_msg = f"Системная ошибка: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            return ConversionResult(False, error_msg)
+        finally:
+            if controls is not None:
+                controls.unregister(control)
+
+    def convert_many(self, jobs, max_workers=None, settings_db=None, progress_callback=None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = max(1, max_workers)
+
+        jobs = iter(jobs)
+        pending = {}
+        controls = ControlRegistry()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        def submit_next():
+            job = next(jobs, None)
+            if job is None:
+                return False
+            job = self._normalize_job(job)
+            pending[executor.submit(
+                self._run_job, job, progress_callback, controls)] = job
+            return True
+
+        try:
+            while len(pending) < max_workers * 2 and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    result = future.result()
+                    if settings_db is not None:
+                        self.record_result(settings_db, job, *result,
+                                           details=result.details)
+                    submit_next()
+                    yield job, result
+        except BaseException:
+            # Ctrl-C или брошенный генератор: ffmpeg в своей сессии сигнал не получил,
+            # поэтому останавливаем запущенные задачи сами, иначе shutdown ждал бы их до конца
+            executor.shutdown(wait=False, cancel_futures=True)
+            cancelled = controls.cancel_all()
+            if cancelled:
+                self.logger.warning(f"Пакет прерван, остановлено задач: {cancelled}")
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def record_result(self, settings_db, job, success, message, details=None):
+        if not settings_db.get_bool("save_history", False):
+            return
+
+        details = dict(details or {})
+        status = 'success' if success else details.pop('aborted', None) or 'error'
+
+        input_file = job['input_file']
+        output_file = None
+        if success:
+            output_file = job.get('output_file') or self.get_output_file(
+                input_file, job['output_format'], job['output_path'])
+
+        settings_db.add_conversion_record(
+            input_file=input_file,
+            output_file=output_file,
+            operation_type=job['operation_type'],
+            format=job['output_format'],
+            quality=details.pop('quality', job['quality']),
+            status=status,
+            message=message,
+            file_size_before=get_file_size(input_file),
+            file_size_after=get_file_size(output_file) if output_file else None,
+            **details
+        )
+
+    def _prepare_output(self, input_file, output_format, output_path):
+        if output_path is None:
+            output_path = os.path.dirname(input_file)
+        else:
+            os.makedirs(output_path, exist_ok=True)
+        return self.get_output_file(input_file, output_format, output_path)
+
+    def _cache_key(self, input_file, operation_type, output_format, args):
+        if self.cache is None or not self.cache.enabled:
+            return None
+        try:
+            return self.cache.make_key(input_file, operation_type, output_format, args,
+                                       self.ffmpeg_version)
+        except OSError as e:
+            self.logger.warning(f"Не удалось вычислить ключ кэша: {e}")
+            return None
+
+    def _from_cache(self, cache_key, output_file, operation_type, **details):
+        if cache_key is None:
+            return None
+        try:
+            entry = self.cache.fetch(cache_key, output_file)
+        except OSError as e:
+            self.logger.warning(f"Не удалось взять результат из кэша: {e}")
+            return None
+        if entry is None:
+            return None
+
+        success_msg = f"{self.MESSAGES[operation_type][0]} (из кэша): {output_file}"
+        self.logger.info(success_msg)
+        return ConversionResult(True, success_msg, cache_status='hit',
+                                encode_seconds=entry['encode_seconds'], **details)
+
+    def _store_cache(self, cache_key, output_file, encode_seconds):
+        if cache_key is None:
+            return
+        try:
+            self.cache.store(cache_key, output_file, encode_seconds)
+        except OSError as e:
+            self.logger.warning(f"Не удалось сохранить результат в кэш: {e}")
+
+    def _finish_output(self, returncode, stderr, output_file, operation_type, cache_key=None,
+                       details=None, log_errors=True):
+        success_text, error_text = self.MESSAGES[operation_type]
+        details = details or {}
+
+        if returncode == 0:
+            if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+                success_msg = f"{success_text}: {output_file}"
+                self.logger.info(success_msg)
+                self._store_cache(cache_key, output_file, details.get('encode_seconds'))
+                return ConversionResult(True, success_msg, **details)
+            else:
+                error_msg = "Выходной файл не был создан"
+                self.logger.error(error_msg)
+                return ConversionResult(False, error_msg, **details)
+
+        error_msg = f"{error_text}: {stderr.text(self.stderr_message_lines)}"
+        if log_errors:
+            self.logger.error(error_msg)
+            self._log_ffmpeg_errors(stderr)
+
+        # ненулевой код — всегда ошибка: файл может быть обрезан или собран из сломанного прохода
+        self._remove_partial([output_file])
+        return ConversionResult(False, error_msg, **details)
+
+    def _execute(self, cmd, input_file, output_file, operation_type, progress_callback=None,
+                 cache_key=None, started=None, control=None, **details):
+        self.logger.debug(f"Выполняемая команда: {' '.join(cmd)}")
+        if started is None:
+            started = time.monotonic()
+        if cache_key is not None:
+            details['cache_status'] = 'miss'
+
+        try:
+            returncode, stderr = self._run_ffmpeg(
+                cmd, input_file, output_file, progress_callback, control)
+        except FileNotFoundError:
+            error_msg = "FFmpeg не найден. Установите FFmpeg."
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg, **details)
+        except ConversionAborted as e:
+            return self._aborted(e, [output_file], **details)
+
+        details['encode_seconds'] = time.monotonic() - started
+        return self._finish_output(returncode, stderr, output_file, operation_type,
+                                   cache_key, details)
+
+    def _encode_outputs(self, input_file, outputs, progress_callback=None, control=None):
+        results = [None] * len(outputs)
+        cmd = ['ffmpeg', '-i', input_file]
+        pending = []
+
+        for index, output in enumerate(outputs):
+            plan = output['plan']
+            self.logger.info(f"Выход {output['output_file']}: {describe_plan(plan)}")
+
+            error_msg = self._preflight(output['output_format'], plan)
+            if error_msg:
+                results[index] = ConversionResult(
+                    False, error_msg, **plan_details(plan))
+                continue
+
+            cache_key = self._cache_key(
+                input_file, output['operation_type'], output['output_format'], plan['args'])
+            cached = self._from_cache(cache_key, output['output_file'], output['operation_type'],
+                                      **plan_details(plan))
+            if cached is not None:
+                results[index] = cached
+                continue
+
+            cmd.extend(output['args'] + ['-y', output['output_file']])
+            pending.append((index, cache_key))
+
+        if not pending:
+            return results
+
+        self.logger.info(
+            f"Одно декодирование для {len(pending)} выходов: {input_file}")
+        self.logger.debug(f"Выполняемая команда: {' '.join(cmd)}")
+        started = time.monotonic()
+        try:
+            returncode, stderr = self._run_ffmpeg(
+                cmd, input_file, outputs[pending[0][0]]['output_file'], progress_callback,
+                control)
+        except FileNotFoundError:
+            error_msg = "FFmpeg не найден. Установите FFmpeg."
+            self.logger.error(error_msg)
+            for index, cache_key in pending:
+                results[index] = ConversionResult(
+                    False, error_msg, **plan_details(outputs[index]['plan']))
+            return results
+        except ConversionAborted as e:
+            for index, cache_key in pending:
+                results[index] = self._aborted(
+                    e, [outputs[index]['output_file']],
+                    **plan_details(outputs[index]['plan']))
+            return results
+
+        elapsed = time.monotonic() - started
+        if returncode != 0:
+            self.logger.error(f"FFmpeg завершился с кодом {returncode}")
+            self._log_ffmpeg_errors(stderr)
+
+        # одно кодирование на все выходы: время делится между ними, чтобы сумма по истории
+        # и сэкономленное кэшем время не умножались на число выходов
+        share = elapsed / len(pending)
+        for index, cache_key in pending:
+            output = outputs[index]
+            details = dict(plan_details(output['plan']), encode_seconds=share)
+            if cache_key is not None:
+                details['cache_status'] = 'miss'
+            results[index] = self._finish_output(
+                returncode, stderr, output['output_file'], output['operation_type'],
+                cache_key, details, log_errors=False)
+        return results
+
+    def convert_multi(self, input_file, outputs, output_path=None, quality=8,
+                      progress_callback=None, control=None, speed_profile=None):
+        targets = []
+        for output in outputs:
+            if isinstance(output, dict):
+                operation_type, output_format = output['operation_type'], output['output_format']
+            else:
+                operation_type, output_format = output
+            if all(target['output_format'] != output_format for target in targets):
+                targets.append({'operation_type': operation_type,
+                               'output_format': output_format})
+
+        if not os.path.isfile(input_file):
+            error_msg = f"Файл {input_file} не найден"
+            self.logger.error(error_msg)
+            return [(target, ConversionResult(False, error_msg)) for target in targets]
+
+        try:
+            probe_info = self.probe.probe(input_file)
+            self.logger.info(
+                f"Конвертация в {len(targets)} форматов: {input_file}, качество: {quality}")
+
+            encodes = []
+            for target in targets:
+                output_format = target['output_format']
+                if target['operation_type'] == 'video':
+                    plan = self._plan_video(probe_info, output_format, quality, speed_profile)
+                    args = plan['args']
+                else:
+                    plan = plan_audio(probe_info, output_format, quality)
+                    args = ['-vn'] + plan['args']
+                encodes.append(dict(target, plan=plan, args=args,
+                                    output_file=self._prepare_output(
+                                        input_file, output_format, output_path)))
+
+            results = self._encode_outputs(input_file, encodes, progress_callback, control)
+        except Exception as e:
+            error_msg = f"Системная ошибка: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            results = [ConversionResult(False, error_msg)] * len(targets)
+
+        return list(zip(targets, results))
+
+    def get_track_output_file(self, input_file, stream, output_format, output_path=None):
+        if output_path is None:
+            output_path = os.path.dirname(input_file)
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        language = stream.get('language') or 'und'
+        return os.path.join(output_path,
+                            f"{base_name}.track{stream['index']}.{language}.{output_format}")
+
+    def extract_audio_tracks(self, input_file, output_format='mp3', output_path=None, quality=8,
+                             progress_callback=None, languages=None, stream_indexes=None,
+                             control=None):
+        if not os.path.isfile(input_file):
+            error_msg = f"Файл {input_file} не найден"
+            self.logger.error(error_msg)
+            return [({'input_file': input_file, 'output_format': output_format},
+                     ConversionResult(False, error_msg))]
+
+        try:
+            probe_info = self.probe.probe(input_file)
+            streams = [stream for stream in (probe_info or {}).get('streams', [])
+                       if stream['codec_type'] == 'audio']
+            if languages:
+                languages = {language.lower() for language in languages}
+                streams = [stream for stream in streams
+                           if (stream.get('language') or 'und').lower() in languages]
+            if stream_indexes:
+                stream_indexes = set(stream_indexes)
+                streams = [stream for stream in streams if stream['index'] in stream_indexes]
+
+            if not streams:
+                error_msg = f"В файле {input_file} нет подходящих аудиодорожек"
+                self.logger.error(error_msg)
+                return [({'input_file': input_file, 'output_format': output_format},
+                         ConversionResult(False, error_msg))]
+
+            if output_path is not None:
+                os.makedirs(output_path, exist_ok=True)
+            self.logger.info(
+                f"Извлечение {len(streams)} аудиодорожек: {input_file}, качество: {quality}")
+
+            tracks = []
+            encodes = []
+            for stream in streams:
+                plan = plan_audio(probe_info, output_format, quality, stream)
+                output_file = self.get_track_output_file(
+                    input_file, stream, output_format, output_path)
+                tracks.append({
+                    'input_file': input_file,
+                    'output_format': output_format,
+                    'output_file': output_file,
+                    'stream_index': stream['index'],
+                    'language': stream.get('language'),
+                })
+                encodes.append({'operation_type': 'audio', 'output_format': output_format,
+                                'output_file': output_file, 'plan': plan,
+                                'args': ['-vn'] + plan['args']})
+
+            return list(zip(tracks, self._encode_outputs(input_file, encodes, progress_callback,
+                                                          control)))
+
+        except Exception as e:
+            error_msg = f"Системная ошибка: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            return [({'input_file': input_file, 'output_format': output_format},
+                     ConversionResult(False, error_msg))]
+
+    def _plan_job(self, input_file, output_format, output_path, operation_type, quality,
+                  speed_profile=None):
+        output_file = self._prepare_output(
+            input_file, output_format, output_path)
+        job = {'output_file': output_file, 'plan': None, 'cache_key': None, 'cmd': None,
+               'result': None}
+
+        if operation_type == 'video':
+            self.logger.info(
+                f"Конвертация видео: {input_file} -> {output_file}, качество: {quality}")
+            plan = self._plan_video(self.probe.probe(input_file),
+                                    output_format, quality, speed_profile)
+            self.logger.info(f"Режим конвертации: {describe_plan(plan)}")
+            cmd = ['ffmpeg', '-i', input_file] + \
+                plan['args'] + ['-y', output_file]
+        else:
+            self.logger.info(
+                f"Извлечение аудио: {input_file} -> {output_file}, качество: {quality}")
+            plan = plan_audio(self.probe.probe(input_file),
+                              output_format, quality)
+            self.logger.info(f"Режим извлечения: {describe_plan(plan)}")
+            cmd = ['ffmpeg', '-i', input_file, '-vn'] + \
+                plan['args'] + ['-y', output_file]
+        job['plan'] = plan
+
+        error_msg = self._preflight(output_format, plan)
+        if error_msg:
+            job['result'] = ConversionResult(
+                False, error_msg, **plan_details(plan))
+            return job
+
+        job['cache_key'] = self._cache_key(
+            input_file, operation_type, output_format, plan['args'])
+        job['result'] = self._from_cache(
+            job['cache_key'], output_file, operation_type, **plan_details(plan))
+        job['cmd'] = cmd
+        return job
+
+    def _convert_single(self, input_file, output_format, output_path, operation_type, quality,
+                        progress_callback=None, control=None, speed_profile=None):
+        if not os.path.isfile(input_file):
+            error_msg = f"Файл {input_file} не найден"
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg)
+
+        try:
+            job = self._plan_job(input_file, output_format,
+                                 output_path, operation_type, quality, speed_profile)
+            if job['result'] is not None:
+                return job['result']
+
+            return self._execute(job['cmd'], input_file, job['output_file'], operation_type,
+                                 progress_callback, job['cache_key'], control=control,
+                                 **plan_details(job['plan']))
+
+        except Exception as e:
+            error_msg = f"Системная ошибка: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            return ConversionResult(False, error_msg)
+
+    def convert_video(self, input_file, output_format='mp4', output_path=None, quality=8,
+                      progress_callback=None, control=None, speed_profile=None):
+        return self._convert_single(input_file, output_format, output_path, 'video', quality,
+                                    progress_callback, control, speed_profile)
+
+    def _segment_count(self, duration, segments=None):
+        if segments is not None:
+            return max(1, int(segments))
+        if not duration:
+            return 1
+        by_duration = int(duration // self.SEGMENT_MIN_SECONDS)
+        return max(1, min(os.cpu_count() or 1, by_duration, self.SEGMENT_MAX_COUNT))
+
+    def convert_video_segmented(self, input_file, output_format='mp4', output_path=None, quality=8,
+                                progress_callback=None, segments=None, max_workers=None,
+                                control=None, speed_profile=None):
+        if not os.path.isfile(input_file):
+            error_msg = f"Файл {input_file} не найден"
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg)
+
+        probe_info = self.probe.probe(input_file)
+        duration = probe_info.get('duration') if probe_info else None
+        plan = self._plan_video(probe_info, output_format, quality, speed_profile)
+        segment_count = self._segment_count(duration, segments)
+
+        if plan.get('video') in (None, 'copy') or not duration or segment_count < 2:
+            self.logger.info(
+                "Сегментное кодирование не требуется, используется обычная конвертация")
+            return self.convert_video(input_file, output_format, output_path, quality,
+                                      progress_callback, control, speed_profile)
+
+        error_msg = self._preflight(output_format, plan)
+        if error_msg:
+            return ConversionResult(False, error_msg, **plan_details(plan))
+
+        temp_dir = None
+        control = control or self.new_control()
+        try:
+            output_file = self._prepare_output(
+                input_file, output_format, output_path)
+
+            cache_key = self._cache_key(
+                input_file, 'video', output_format, plan['args'])
+            cached = self._from_cache(
+                cache_key, output_file, 'video', **plan_details(plan))
+            if cached is not None:
+                return cached
+
+            started = time.monotonic()
+            temp_dir = tempfile.mkdtemp(prefix='mcv_segments_')
+            cpu_budget = control.threads or os.cpu_count() or 1
+            if max_workers is None:
+                max_workers = min(segment_count, cpu_budget)
+            threads = max(1, cpu_budget // max_workers)
+
+            self.logger.info(
+                f"Сегментная конвертация видео: {input_file} -> {output_file}, "
+                f"сегментов: {segment_count}, потоков: {max_workers}")
+
+            split_times = ','.join(
+                f"{duration * i / segment_count:.3f}" for i in range(1, segment_count))
+            split_pattern = os.path.join(temp_dir, 'source_%04d.mkv')
+            split_cmd = ['ffmpeg', '-i', input_file, '-map', '0:V:0', '-c', 'copy', '-f', 'segment',
+                         '-segment_times', split_times, '-reset_timestamps', '1', '-y', split_pattern]
+            returncode, stderr = run_ffmpeg(
+                split_cmd, stderr_lines=self.stderr_lines, control=control)
+            if returncode != 0:
+                error_msg = f"Ошибка разбиения на сегменты: {stderr.text(self.stderr_message_lines)}"
+                self.logger.error(error_msg)
+                self._log_ffmpeg_errors(stderr)
+                return ConversionResult(False, error_msg, **plan_details(plan))
+
+            sources = sorted(name for name in os.listdir(temp_dir)
+                             if name.startswith('source_'))
+            encoded = [os.path.join(temp_dir, name.replace('source_', 'encoded_'))
+                       for name in sources]
+            positions = [0.0] * len(sources)
+            lock = threading.Lock()
+
+            def report(index, info):
+                if progress_callback is None:
+                    return
+                with lock:
+                    positions[index] = max(positions[index], info['out_time'])
+                    done = sum(positions)
+                progress_callback({
+                    'out_time': done,
+                    'duration': duration,
+                    'percent': min(100.0, done / duration * 100),
+                    'eta': None,
+                    'fps': None,
+                    'speed': info['speed'],
+                    'total_size': None,
+                    'elapsed': info['elapsed'],
+                    'done': False,
+                })
+
+            def encode(index):
+                cmd = ['ffmpeg', '-i', os.path.join(temp_dir, sources[index]), '-map', '0:v'] + \
+                    plan['video_args'] + ['-threads', str(threads), '-an', '-y', encoded[index]]
+                return run_ffmpeg(cmd, None, lambda info: report(index, info), self.stderr_lines,
+                                  control=control)
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(encode, range(len(sources))))
+
+            for returncode, stderr in results:
+                if returncode != 0:
+                    error_msg = f"Ошибка кодирования сегмента: {stderr.text(self.stderr_message_lines)}"
+                    self.logger.error(error_msg)
+                    self._log_ffmpeg_errors(stderr)
+                    return ConversionResult(False, error_msg, **plan_details(plan))
+
+            concat_list = os.path.join(temp_dir, 'segments.txt')
+            with open(concat_list, 'w', encoding='utf-8') as f:
+                for path in encoded:
+                    escaped = path.replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+
+            cmd = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', concat_list, '-i', input_file,
+                   '-map', '0:v', '-map', '1:a:0?', '-c:v', 'copy'] + plan['audio_args'] + \
+                ['-y', output_file]
+
+            return self._execute(cmd, input_file, output_file, 'video', progress_callback,
+                                 cache_key, started, control, **plan_details(plan),
+                                 segments=len(sources))
+
+        except ConversionAborted as e:
+            return self._aborted(e, [], **plan_details(plan))
+        except Exception as e:
+            error_msg = f"Системная ошибка: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            return ConversionResult(False, error_msg)
+        finally:
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def convert_video_target(self, input_file, output_format='mp4', output_path=None,
+                             target_size=None, target_bitrate=None, progress_callback=None,
+                             control=None, speed_profile=None):
+        if not os.path.isfile(input_file):
+            error_msg = f"Файл {input_file} не найден"
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg)
+
+        targets = {'target_size': target_size, 'target_bitrate': target_bitrate}
+        probe_info = self.probe.probe(input_file)
+        duration = probe_info.get('duration') if probe_info else None
+        has_audio = bool(probe_info) and any(
+            stream['codec_type'] == 'audio' for stream in probe_info['streams'])
+
+        bitrates = target_bitrates(
+            duration, has_audio, target_size,
+            target_bitrate * 1000 if target_bitrate is not None else None)
+        if bitrates is None:
+            if not duration and target_bitrate is None:
+                error_msg = "Не удалось определить длительность для расчета битрейта"
+            else:
+                error_msg = "Целевой размер слишком мал для этой длительности"
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg, **targets)
+
+        plan = plan_target(probe_info, output_format, *bitrates,
+                           self.get_speed_profile(speed_profile))
+        if plan is None:
+            error_msg = f"Формат {output_format} не поддерживает двухпроходное кодирование"
+            self.logger.error(error_msg)
+            return ConversionResult(False, error_msg, **targets)
+
+        self.logger.info(f"Режим конвертации: {describe_plan(plan)}, "
+                         f"видео {bitrates[0] // 1000}k, аудио {bitrates[1] // 1000}k")
+        error_msg = self._preflight(output_format, plan)
+        if error_msg:
+            return ConversionResult(False, error_msg, **plan_details(plan), **targets)
+
+        temp_dir = None
+        control = control or self.new_control()
+        try:
+            output_file = self._prepare_output(
+                input_file, output_format, output_path)
+
+            cache_key = self._cache_key(
+                input_file, 'video', output_format, plan['args'])
+            cached = self._from_cache(
+                cache_key, output_file, 'video', **plan_details(plan), **targets)
+            if cached is not None:
+                return cached
+
+            started = time.monotonic()
+            temp_dir = tempfile.mkdtemp(prefix='mcv_2pass_')
+            passlog = os.path.join(temp_dir, 'pass')
+
+            def report(first_pass, info):
+                if progress_callback is None or info['percent'] is None:
+                    return
+                info = dict(info)
+                if first_pass:
+                    info['percent'] = info['percent'] / 2
+                    if info['eta'] is not None:
+                        info['eta'] = info['eta'] * 2 + info['elapsed']
+                    info['done'] = False
+                else:
+                    info['percent'] = 50 + info['percent'] / 2
+                progress_callback(info)
+
+            self.logger.info(f"Первый проход: {input_file}")
+            first_cmd = ['ffmpeg', '-i', input_file] + plan['first_pass_args'] + \
+                ['-pass', '1', '-passlogfile', passlog, '-f', 'null', '-y', os.devnull]
+            returncode, stderr = run_ffmpeg(apply_threads(first_cmd, control.threads), duration,
+                                            lambda info: report(True, info), self.stderr_lines,
+                                            control=control)
+            if returncode != 0:
+                error_msg = f"Ошибка первого прохода: {stderr.text(self.stderr_message_lines)}"
+                self.logger.error(error_msg)
+                self._log_ffmpeg_errors(stderr)
+                return ConversionResult(False, error_msg, **plan_details(plan), **targets)
+
+            video_bitrate, audio_bitrate = bitrates
+            attempt = 1
+            while True:
+                self.logger.info(f"Второй проход: {input_file} -> {output_file}")
+                cmd = ['ffmpeg', '-i', input_file] + plan['args'] + \
+                    ['-pass', '2', '-passlogfile', passlog, '-y', output_file]
+                # в кэш попадает только результат, который уложился в размер
+                result = self._execute(cmd, input_file, output_file, 'video',
+                                       lambda info: report(False, info), None, started,
+                                       control, **plan_details(plan), **targets)
+                if not result.success or not target_size:
+                    break
+
+                achieved = get_file_size(output_file)
+                self.logger.info(
+                    f"Размер результата: {achieved} байт из {target_size} "
+                    f"({achieved / target_size * 100:.1f}%)")
+                if achieved <= target_size:
+                    break
+
+                # контейнер съел больше заложенного: уменьшаем битрейт пропорционально перелету,
+                # журнал первого прохода от битрейта не зависит и годится повторно
+                total = (video_bitrate + audio_bitrate) * target_size / achieved
+                video_bitrate = int(total * (1 - self.TARGET_SIZE_MARGIN)) - audio_bitrate
+                if attempt >= self.TARGET_SIZE_ATTEMPTS or video_bitrate < MIN_VIDEO_BITRATE:
+                    error_msg = (f"Не удалось уложиться в целевой размер: {achieved} байт "
+                                 f"при цели {target_size}")
+                    self.logger.error(error_msg)
+                    self._remove_partial([output_file])
+                    return ConversionResult(False, error_msg, **plan_details(plan), **targets)
+
+                attempt += 1
+                self.logger.warning(
+                    f"Файл больше целевого размера, повтор второго прохода "
+                    f"с битрейтом видео {video_bitrate // 1000}k")
+                plan = plan_target(probe_info, output_format, video_bitrate, audio_bitrate,
+                                   plan['speed_profile'])
+
+            if result.success and cache_key is not None:
+                result.details['cache_status'] = 'miss'
+                self._store_cache(cache_key, output_file, result.details.get('encode_seconds'))
+            return result
+
+        except ConversionAborted as e:
+            return self._aborted(e, [], **plan_details(plan), **targets)
+        except Exception as e:
+            error_msg = f"Системная ошибка: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            return ConversionResult(False, error_msg, **targets)
+        finally:
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def extract_audio(self, input_file, output_format='mp3', output_path=None, quality=8,
+                      progress_callback=None, control=None):
+        return self._convert_single(input_file, output_format, output_path, 'audio', quality,
+                                    progress_callback, control)
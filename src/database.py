@@ -1,16 +1,78 @@
+import json
+import time
 import sqlite3
+import logging
+import threading
 from datetime import datetime
 
 
 class SettingsDB:
+    _history_extra_columns = [
+        ('conversion_mode', 'TEXT'),
+        ('cache_status', 'TEXT'),
+        ('encode_seconds', 'REAL'),
+        ('target_size', 'INTEGER'),
+        ('target_bitrate', 'INTEGER'),
+        ('speed_profile', 'TEXT'),
+    ]
+
+    # сколько мс ждать блокировку записи, пока ее держит другой поток или процесс
+    BUSY_TIMEOUT_MS = 30000
+    # через сколько секунд кэш настроек перечитывается, чтобы увидеть изменения других процессов
+    SETTINGS_TTL = 2.0
+
     def __init__(self, db_path='settings.db'):
         self.db_path = db_path
+        self._local = threading.local()
+        self._settings = None
+        self._settings_loaded = 0.0
+        self._settings_lock = threading.Lock()
+        self.history_recorder = None
         self.init_db()
 
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT_MS / 1000)
+            conn.execute(f'PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS}')
+            # в WAL-режиме fsync при NORMAL нужен только на контрольных точках
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        elif conn.in_transaction:
+            # транзакция осталась после исключения в предыдущем вызове
+            conn.rollback()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        # WAL позволяет читать во время записи, в том числе из других процессов
+        cursor.execute('PRAGMA journal_mode = WAL')
 
+        migrations = [self._migrate_base, self._migrate_history_indexes,
+                      self._migrate_history_stats]
+        for version, migrate in enumerate(migrations, 1):
+            if cursor.execute('PRAGMA user_version').fetchone()[0] >= version:
+                continue
+            try:
+                # блокировка записи сразу: два процесса не выполнят одну миграцию дважды
+                cursor.execute('BEGIN IMMEDIATE')
+                if cursor.execute('PRAGMA user_version').fetchone()[0] < version:
+                    migrate(cursor)
+                    cursor.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+
+    def _migrate_base(self, cursor):
+        # базы до появления версий схемы уже содержат часть таблиц, поэтому IF NOT EXISTS
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS settings (
                 key TEXT PRIMARY KEY,
@@ -34,26 +96,214 @@ class SettingsDB:
             )
         ''')
 
-        conn.commit()
-        conn.close()
+        cursor.execute('PRAGMA table_info(conversion_history)')
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        for column, column_type in self._history_extra_columns:
+            if column not in existing_columns:
+                cursor.execute(
+                    f'ALTER TABLE conversion_history ADD COLUMN {column} {column_type}')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversion_cache (
+                cache_key TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                encode_seconds REAL,
+                created_at TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS watch_index (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                output_file TEXT,
+                processed_at TEXT NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ffmpeg_capabilities (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                detected_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_probe (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                probed_at TEXT NOT NULL,
+                format_name TEXT,
+                duration REAL,
+                bit_rate INTEGER,
+                width INTEGER,
+                height INTEGER,
+                video_codec TEXT,
+                audio_codec TEXT,
+                streams TEXT
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                input_file TEXT NOT NULL,
+                output_format TEXT NOT NULL,
+                output_path TEXT,
+                operation_type TEXT NOT NULL,
+                quality INTEGER,
+                params TEXT,
+                output_file TEXT,
+                state TEXT NOT NULL DEFAULT 'queued',
+                priority INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                worker TEXT,
+                lease_until REAL,
+                heartbeat_at REAL,
+                message TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (state, priority DESC, id)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS encode_samples (
+                host TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                source_codec TEXT NOT NULL,
+                encoder TEXT NOT NULL,
+                speed_profile TEXT NOT NULL,
+                quality INTEGER NOT NULL,
+                speed REAL NOT NULL,
+                bitrate INTEGER,
+                sampled_at TEXT NOT NULL,
+                PRIMARY KEY (host, width, height, source_codec, encoder, speed_profile, quality)
+            )
+        ''')
+
+    def _migrate_history_indexes(self, cursor):
+        for column in ('timestamp', 'status', 'operation_type', 'format'):
+            cursor.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_history_{column} ON conversion_history ({column})
+            ''')
+
+    # счетчики для get_statistics: kind — total, status, operation, format или cache
+    _stats_groups = [
+        ('total', "''"),
+        ('status', 'status'),
+        ('operation', 'operation_type'),
+        ('format', 'format'),
+        ('cache', 'cache_status'),
+    ]
+
+    def _migrate_history_stats(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS history_stats (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                bytes_before INTEGER NOT NULL DEFAULT 0,
+                bytes_after INTEGER NOT NULL DEFAULT 0,
+                encode_seconds REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, key)
+            )
+        ''')
+
+        cursor.execute('DELETE FROM history_stats')
+        for kind, column in self._stats_groups:
+            cursor.execute(f'''
+                INSERT INTO history_stats (kind, key, count, bytes_before, bytes_after, encode_seconds)
+                SELECT '{kind}', {column}, COUNT(*), COALESCE(SUM(file_size_before), 0),
+                       COALESCE(SUM(file_size_after), 0), COALESCE(SUM(encode_seconds), 0)
+                FROM conversion_history
+                WHERE {column} IS NOT NULL
+                GROUP BY {column}
+            ''')
+
+        insert = []
+        for kind, column in self._stats_groups:
+            new_key = "''" if column == "''" else f'NEW.{column}'
+            insert.append(f'''
+                INSERT INTO history_stats (kind, key, count, bytes_before, bytes_after, encode_seconds)
+                SELECT '{kind}', {new_key}, 1, COALESCE(NEW.file_size_before, 0),
+                       COALESCE(NEW.file_size_after, 0), COALESCE(NEW.encode_seconds, 0)
+                WHERE {new_key} IS NOT NULL
+                ON CONFLICT (kind, key) DO UPDATE SET
+                    count = count + 1,
+                    bytes_before = bytes_before + excluded.bytes_before,
+                    bytes_after = bytes_after + excluded.bytes_after,
+                    encode_seconds = encode_seconds + excluded.encode_seconds;''')
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS history_stats_insert
+            AFTER INSERT ON conversion_history
+            BEGIN{''.join(insert)}
+            END
+        ''')
+        self._create_history_delete_trigger(cursor)
+
+    def _create_history_delete_trigger(self, cursor):
+        delete = []
+        for kind, column in self._stats_groups:
+            old_key = "''" if column == "''" else f'OLD.{column}'
+            delete.append(f'''
+                UPDATE history_stats SET
+                    count = count - 1,
+                    bytes_before = bytes_before - COALESCE(OLD.file_size_before, 0),
+                    bytes_after = bytes_after - COALESCE(OLD.file_size_after, 0),
+                    encode_seconds = encode_seconds - COALESCE(OLD.encode_seconds, 0)
+                WHERE kind = '{kind}' AND key = {old_key};''')
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS history_stats_delete
+            AFTER DELETE ON conversion_history
+            BEGIN{''.join(delete)}
+            END
+        ''')
+
+    def _load_settings(self):
+        with self._settings_lock:
+            if self._settings is not None \
+                    and time.monotonic() - self._settings_loaded < self.SETTINGS_TTL:
+                return self._settings
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, value FROM settings')
+        settings = dict(cursor.fetchall())
+        with self._settings_lock:
+            self._settings = settings
+            self._settings_loaded = time.monotonic()
+        return settings
 
     def set_value(self, key, value):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)
         ''', (key, str(value)))
         conn.commit()
-        conn.close()
+        with self._settings_lock:
+            if self._settings is not None:
+                self._settings = dict(self._settings, **{key: str(value)})
 
     def get_value(self, key, default=None):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
-        result = cursor.fetchone()
-        conn.close()
-        if result:
-            return result[0]
+        settings = self._load_settings()
+        if key in settings:
+            return settings[key]
         return default
 
     def get_bool(self, key, default=False):
@@ -72,39 +322,78 @@ class SettingsDB:
             return default
 
     def clear(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('DELETE FROM settings')
         conn.commit()
-        conn.close()
+        with self._settings_lock:
+            self._settings = None
 
-    def add_conversion_record(self, input_file, output_file, operation_type,
-                              format, quality, status, message, file_size_before=None, file_size_after=None):
-        conn = sqlite3.connect(self.db_path)
+    def _history_columns(self):
+        return ['timestamp', 'input_file', 'output_file', 'operation_type', 'format', 'quality',
+                'status', 'message', 'file_size_before', 'file_size_after'] + \
+            [column for column, _ in self._history_extra_columns]
+
+    def add_conversion_records(self, records):
+        columns = self._history_columns()
+        rows = [tuple(record.get(column) for column in columns) for record in records]
+        if not rows:
+            return 0
+
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.executemany(f'''
+            INSERT INTO conversion_history
+            ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', rows)
+        conn.commit()
+        return len(rows)
 
-        cursor.execute('''
-            INSERT INTO conversion_history 
-            (timestamp, input_file, output_file, operation_type, format, quality, status, message, file_size_before, file_size_after)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            input_file,
-            output_file,
-            operation_type,
-            format,
-            quality,
-            status,
-            message,
-            file_size_before,
-            file_size_after
-        ))
-
-        conn.commit()
-        conn.close()
+    def import_history(self, records, batch_size=1000):
+        self.flush_history()
+        imported = 0
+        batch = []
+        for record in records:
+            missing = [key for key in ('timestamp', 'input_file', 'operation_type', 'format',
+                                       'status') if not record.get(key)]
+            if missing:
+                raise ValueError(f"В записи истории нет полей: {', '.join(missing)}")
+            batch.append(record)
+            if len(batch) >= batch_size:
+                imported += self.add_conversion_records(batch)
+                batch = []
+        return imported + self.add_conversion_records(batch)
+
+    def add_conversion_record(self, input_file, output_file, operation_type,
+                              format, quality, status, message, file_size_before=None, file_size_after=None,
+                              **details):
+        record = dict(details, timestamp=datetime.now().isoformat(), input_file=input_file,
+                      output_file=output_file, operation_type=operation_type, format=format,
+                      quality=quality, status=status, message=message,
+                      file_size_before=file_size_before, file_size_after=file_size_after)
+        if self.history_recorder is not None:
+            self.history_recorder.record(record)
+        else:
+            self.add_conversion_records([record])
+
+    def start_history_recorder(self, batch_size=200, flush_interval=1.0):
+        if self.history_recorder is None:
+            self.history_recorder = HistoryRecorder(self, batch_size, flush_interval)
+        return self.history_recorder
+
+    def stop_history_recorder(self):
+        recorder, self.history_recorder = self.history_recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def flush_history(self):
+        if self.history_recorder is not None:
+            self.history_recorder.flush()
 
     def get_conversion_history(self, limit=100):
-        conn = sqlite3.connect(self.db_path)
+        self.flush_history()
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -114,56 +403,488 @@ class SettingsDB:
         ''', (limit,))
 
         results = cursor.fetchall()
-        conn.close()
-
-        columns = ['id', 'timestamp', 'input_file', 'output_file', 'operation_type',
-                   'format', 'quality', 'status', 'message', 'file_size_before', 'file_size_after']
+        columns = [column[0] for column in cursor.description]
 
         return [dict(zip(columns, row)) for row in results]
 
+    _history_page_columns = ['id', 'timestamp', 'operation_type', 'input_file', 'format', 'quality',
+                             'status', 'file_size_before', 'file_size_after']
+
+    def get_history_page(self, before=None, limit=200):
+        # keyset-пагинация: страница начинается после последней строки предыдущей (timestamp, id),
+        # поэтому стоимость не зависит от того, как далеко пролистана история
+        self.flush_history()
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        columns = ', '.join(self._history_page_columns)
+        if before is None:
+            cursor.execute(f'''
+                SELECT {columns} FROM conversion_history
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', (limit,))
+        else:
+            timestamp, row_id = before
+            cursor.execute(f'''
+                SELECT {columns} FROM conversion_history
+                WHERE timestamp <= ? AND (timestamp < ? OR id < ?)
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', (timestamp, timestamp, row_id, limit))
+        return cursor.fetchall()
+
+    def get_conversion_record(self, record_id):
+        self.flush_history()
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM conversion_history WHERE id = ?', (record_id,))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+        columns = [column[0] for column in cursor.description]
+        return dict(zip(columns, result))
+
     def clear_history(self):
-        conn = sqlite3.connect(self.db_path)
+        self.flush_history()
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM conversion_history')
-        conn.commit()
-        conn.close()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            # построчный триггер на миллионе записей — несколько миллионов UPDATE;
+            # без триггера SQLite очищает таблицу целиком, а счетчики обнуляются разом
+            cursor.execute('DROP TRIGGER IF EXISTS history_stats_delete')
+            cursor.execute('DELETE FROM conversion_history')
+            cursor.execute('DELETE FROM history_stats')
+            self._create_history_delete_trigger(cursor)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
 
     def get_statistics(self):
-        conn = sqlite3.connect(self.db_path)
+        self.flush_history()
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            'SELECT kind, key, count, bytes_before, bytes_after, encode_seconds FROM history_stats')
+        groups = {}
+        for kind, key, count, bytes_before, bytes_after, encode_seconds in cursor.fetchall():
+            if count > 0:
+                groups.setdefault(kind, {})[key] = (count, bytes_before, bytes_after,
+                                                    encode_seconds)
+
+        def counts(kind):
+            return {key: values[0] for key, values in groups.get(kind, {}).items()}
+
+        total, bytes_before, bytes_after, _ = groups.get('total', {}).get('', (0, 0, 0, 0))
+        by_status = counts('status')
+        success = by_status.get('success', 0)
+        cache_hits, _, _, cache_saved_seconds = groups.get('cache', {}).get('hit', (0, 0, 0, 0))
+
+        return {
+            'total': total,
+            'success': success,
+            'error': by_status.get('error', 0),
+            'cancelled': by_status.get('cancelled', 0),
+            'timeout': by_status.get('timeout', 0),
+            'success_rate': (success / total * 100) if total > 0 else 0,
+            'by_operation': counts('operation'),
+            'by_format': counts('format'),
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'cache_hits': cache_hits,
+            'cache_saved_seconds': cache_saved_seconds
+        }
+
+    _probe_columns = ['path', 'size', 'mtime_ns', 'probed_at', 'format_name', 'duration',
+                      'bit_rate', 'width', 'height', 'video_codec', 'audio_codec', 'streams']
+
+    def get_media_probe(self, path, size=None, mtime_ns=None):
+        conn = self._connect()
         cursor = conn.cursor()
 
-        cursor.execute('SELECT COUNT(*) FROM conversion_history')
-        total = cursor.fetchone()[0]
+        if size is None or mtime_ns is None:
+            cursor.execute(
+                'SELECT * FROM media_probe WHERE path = ?', (path,))
+        else:
+            cursor.execute('''
+                SELECT * FROM media_probe
+                WHERE path = ? AND size = ? AND mtime_ns = ?
+            ''', (path, size, mtime_ns))
+
+        result = cursor.fetchone()
+
+        if result is None:
+            return None
+        record = dict(zip(self._probe_columns, result))
+        record['streams'] = json.loads(record['streams'] or '[]')
+        return record
+
+    def save_media_probes(self, records):
+        conn = self._connect()
+        cursor = conn.cursor()
 
+        cursor.executemany('''
+            INSERT OR REPLACE INTO media_probe
+            (path, size, mtime_ns, probed_at, format_name, duration, bit_rate,
+             width, height, video_codec, audio_codec, streams)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            record['path'],
+            record['size'],
+            record['mtime_ns'],
+            record.get('probed_at') or datetime.now().isoformat(),
+            record.get('format_name'),
+            record.get('duration'),
+            record.get('bit_rate'),
+            record.get('width'),
+            record.get('height'),
+            record.get('video_codec'),
+            record.get('audio_codec'),
+            json.dumps(record.get('streams', []))
+        ) for record in records])
+
+        conn.commit()
+
+    def save_media_probe(self, record):
+        self.save_media_probes([record])
+
+    def get_cache_entry(self, cache_key):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT path, size, encode_seconds FROM conversion_cache WHERE cache_key = ?', (cache_key,))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+        return {'cache_key': cache_key, 'path': result[0], 'size': result[1], 'encode_seconds': result[2]}
+
+    def touch_cache_entry(self, cache_key, last_access):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE conversion_cache SET last_access = ?, hits = hits + 1 WHERE cache_key = ?
+        ''', (last_access, cache_key))
+        conn.commit()
+
+    def put_cache_entry(self, cache_key, path, size, encode_seconds, last_access):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO conversion_cache
+            (cache_key, path, size, encode_seconds, created_at, last_access, hits)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', (cache_key, path, size, encode_seconds, datetime.now().isoformat(), last_access))
+        conn.commit()
+
+    def delete_cache_entry(self, cache_key):
+        conn = self._connect()
+        cursor = conn.cursor()
         cursor.execute(
-            'SELECT COUNT(*) FROM conversion_history WHERE status = "success"')
-        success = cursor.fetchone()[0]
+            'DELETE FROM conversion_cache WHERE cache_key = ?', (cache_key,))
+        conn.commit()
 
+    def get_cache_usage(self):
+        conn = self._connect()
+        cursor = conn.cursor()
         cursor.execute(
-            'SELECT COUNT(*) FROM conversion_history WHERE status = "error"')
-        error = cursor.fetchone()[0]
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM conversion_cache')
+        count, total_size = cursor.fetchone()
+        return count, total_size
 
+    def get_cache_lru(self, limit=100):
+        conn = self._connect()
+        cursor = conn.cursor()
         cursor.execute('''
-            SELECT operation_type, COUNT(*) 
-            FROM conversion_history 
-            GROUP BY operation_type
-        ''')
-        by_operation = dict(cursor.fetchall())
+            SELECT cache_key, path, size FROM conversion_cache
+            ORDER BY last_access ASC
+            LIMIT ?
+        ''', (limit,))
+        results = cursor.fetchall()
+        return [{'cache_key': row[0], 'path': row[1], 'size': row[2]} for row in results]
 
+    def get_watch_index(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT path, size, mtime_ns FROM watch_index')
+        results = cursor.fetchall()
+        return {path: (size, mtime_ns) for path, size, mtime_ns in results}
+
+    def mark_watch_processed(self, path, size, mtime_ns, status, output_file=None):
+        conn = self._connect()
+        cursor = conn.cursor()
         cursor.execute('''
-            SELECT format, COUNT(*) 
-            FROM conversion_history 
-            GROUP BY format
-        ''')
-        by_format = dict(cursor.fetchall())
+            INSERT OR REPLACE INTO watch_index
+            (path, size, mtime_ns, status, output_file, processed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (path, size, mtime_ns, status, output_file, datetime.now().isoformat()))
+        conn.commit()
 
-        conn.close()
+    def get_ffmpeg_capabilities(self, path, mtime_ns):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT data FROM ffmpeg_capabilities WHERE path = ? AND mtime_ns = ?', (path, mtime_ns))
+        result = cursor.fetchone()
+        return json.loads(result[0]) if result else None
 
-        return {
-            'total': total,
-            'success': success,
-            'error': error,
-            'success_rate': (success / total * 100) if total > 0 else 0,
-            'by_operation': by_operation,
-            'by_format': by_format
-        }
+    def save_ffmpeg_capabilities(self, path, mtime_ns, data):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO ffmpeg_capabilities (path, mtime_ns, detected_at, data)
+            VALUES (?, ?, ?, ?)
+        ''', (path, mtime_ns, datetime.now().isoformat(), json.dumps(data)))
+        conn.commit()
+
+    def get_encode_sample(self, host, width, height, source_codec, encoder, speed_profile,
+                          quality):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT speed, bitrate FROM encode_samples
+            WHERE host = ? AND width = ? AND height = ? AND source_codec = ? AND encoder = ?
+                AND speed_profile = ? AND quality = ?
+        ''', (host, width, height, source_codec, encoder, speed_profile, quality))
+        result = cursor.fetchone()
+        return {'speed': result[0], 'bitrate': result[1]} if result else None
+
+    def save_encode_sample(self, host, width, height, source_codec, encoder, speed_profile,
+                           quality, speed, bitrate):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO encode_samples
+            (host, width, height, source_codec, encoder, speed_profile, quality, speed, bitrate,
+             sampled_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (host, width, height, source_codec, encoder, speed_profile, quality, speed, bitrate,
+              datetime.now().isoformat()))
+        conn.commit()
+
+    _job_columns = ['id', 'input_file', 'output_format', 'output_path', 'operation_type', 'quality',
+                    'params', 'output_file', 'state', 'priority', 'attempts', 'max_attempts',
+                    'worker', 'lease_until', 'heartbeat_at', 'message', 'created_at', 'updated_at']
+    _job_fields = ['input_file', 'output_format', 'output_path', 'operation_type', 'quality']
+
+    def _job_record(self, row):
+        record = dict(zip(self._job_columns, row))
+        params = json.loads(record.pop('params') or '{}')
+        record.update(params)
+        return record
+
+    def add_job(self, job, priority=0, max_attempts=3):
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT id FROM jobs
+            WHERE input_file = ? AND operation_type = ? AND output_format = ?
+              AND output_path IS ? AND state != 'failed'
+        ''', (job['input_file'], job['operation_type'], job['output_format'], job.get('output_path')))
+        existing = cursor.fetchone()
+        if existing is not None:
+            return existing[0], False
+
+        params = {key: value for key, value in job.items()
+                  if key not in self._job_fields and value is not None}
+        now = datetime.now().isoformat()
+        cursor.execute('''
+            INSERT INTO jobs
+            (input_file, output_format, output_path, operation_type, quality, params,
+             priority, max_attempts, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (job['input_file'], job['output_format'], job.get('output_path'), job['operation_type'],
+              job.get('quality'), json.dumps(params), priority, max_attempts, now, now))
+        job_id = cursor.lastrowid
+
+        conn.commit()
+        return job_id, True
+
+    def claim_job(self, worker, lease_until):
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            # BEGIN IMMEDIATE берет блокировку записи сразу: два диспетчера не возьмут одну задачу
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT * FROM jobs WHERE state = 'queued'
+                ORDER BY priority DESC, id ASC
+                LIMIT 1
+            ''')
+            row = cursor.fetchone()
+            if row is None:
+                conn.commit()
+                return None
+
+            cursor.execute('''
+                UPDATE jobs
+                SET state = 'running', worker = ?, lease_until = ?, heartbeat_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            ''', (worker, lease_until, time.time(), datetime.now().isoformat(), row[0]))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+        record = self._job_record(row)
+        record.update({'state': 'running', 'worker': worker, 'lease_until': lease_until,
+                       'attempts': record['attempts'] + 1})
+        return record
+
+    def heartbeat_jobs(self, job_ids, worker, lease_until):
+        conn = self._connect()
+        cursor = conn.cursor()
+        now = time.time()
+        cursor.executemany('''
+            UPDATE jobs SET lease_until = ?, heartbeat_at = ?
+            WHERE id = ? AND worker = ? AND state = 'running'
+        ''', [(lease_until, now, job_id, worker) for job_id in job_ids])
+        conn.commit()
+
+    def finish_job(self, job_id, worker, success, message=None, output_file=None):
+        conn = self._connect()
+        cursor = conn.cursor()
+        if success:
+            cursor.execute('''
+                UPDATE jobs
+                SET state = 'done', message = ?, output_file = ?, lease_until = NULL,
+                    updated_at = ?
+                WHERE id = ? AND worker = ?
+            ''', (message, output_file, datetime.now().isoformat(), job_id, worker))
+        else:
+            cursor.execute('''
+                UPDATE jobs
+                SET state = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                    message = ?, worker = NULL, lease_until = NULL, updated_at = ?
+                WHERE id = ? AND worker = ?
+            ''', (message, datetime.now().isoformat(), job_id, worker))
+        conn.commit()
+
+    def requeue_cancelled_job(self, job_id, worker, message):
+        conn = self._connect()
+        cursor = conn.cursor()
+        # прерванный запуск не считается попыткой: задача не должна провалиться от остановок
+        cursor.execute('''
+            UPDATE jobs
+            SET state = 'queued', attempts = MAX(attempts - 1, 0),
+                message = ?, worker = NULL, lease_until = NULL, updated_at = ?
+            WHERE id = ? AND worker = ? AND state = 'running'
+        ''', (message, datetime.now().isoformat(), job_id, worker))
+        conn.commit()
+
+    def requeue_expired_jobs(self, now=None):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs
+            SET state = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                message = 'Аренда истекла: обработчик не отвечал',
+                worker = NULL, lease_until = NULL, updated_at = ?
+            WHERE state = 'running' AND lease_until < ?
+        ''', (datetime.now().isoformat(), now if now is not None else time.time()))
+        count = cursor.rowcount
+        conn.commit()
+        return count
+
+    def requeue_jobs(self, job_ids, message):
+        conn = self._connect()
+        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+        cursor.executemany('''
+            UPDATE jobs
+            SET state = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                message = ?, worker = NULL, lease_until = NULL, updated_at = ?
+            WHERE id = ? AND state = 'running'
+        ''', [(message, now, job_id) for job_id in job_ids])
+        count = cursor.rowcount
+        conn.commit()
+        return count
+
+    def get_jobs(self, states=None, limit=100):
+        conn = self._connect()
+        cursor = conn.cursor()
+        if states:
+            cursor.execute(f'''
+                SELECT * FROM jobs WHERE state IN ({', '.join('?' * len(states))})
+                ORDER BY priority DESC, id ASC
+                LIMIT ?
+            ''', (*states, limit))
+        else:
+            cursor.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,))
+        results = cursor.fetchall()
+        return [self._job_record(row) for row in results]
+
+    def get_job_counts(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state')
+        results = dict(cursor.fetchall())
+        return results
+
+
+class HistoryRecorder:
+    def __init__(self, settings_db, batch_size=200, flush_interval=1.0):
+        self.settings_db = settings_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+
+        self.pending = []
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, record):
+        with self.condition:
+            closed = self.closed
+            if not closed:
+                self.pending.append(record)
+                if len(self.pending) >= self.batch_size:
+                    self.condition.notify()
+        if closed:
+            self.settings_db.add_conversion_records([record])
+
+    def _take(self):
+        with self.condition:
+            batch, self.pending = self.pending, []
+        return batch
+
+    def flush(self):
+        # запись под блокировкой: flush из другого потока не обгонит пачку, которую уже пишет фон
+        with self.write_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            try:
+                return self.settings_db.add_conversion_records(batch)
+            except Exception as e:
+                self.logger.error(f"Не удалось записать историю ({len(batch)} записей): {e}")
+                with self.condition:
+                    self.pending[:0] = batch
+                raise
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.closed and len(self.pending) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+                closed = self.closed
+            try:
+                self.flush()
+            except Exception:
+                pass
+            if closed:
+                break
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        self.flush()
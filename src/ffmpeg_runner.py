@@ -0,0 +1,364 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+
+
+def _parse_float(value):
+    try:
+        return float(value.strip().rstrip('x'))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class ProgressParser:
+    def __init__(self, duration=None, callback=None):
+        self.duration = duration if duration and duration > 0 else None
+        self.callback = callback
+        self.started = time.monotonic()
+        self.last_activity = self.started
+        self.fields = {}
+        self.last = None
+
+    def feed(self, line):
+        line = line.strip()
+        if '=' not in line:
+            return
+        key, value = line.split('=', 1)
+        self.fields[key] = value
+        if key == 'progress':
+            previous = self.last
+            self.last = self._build(value == 'end')
+            self.fields = {}
+            if previous is None or self.last['out_time'] > previous['out_time'] \
+                    or self.last['total_size'] != previous['total_size']:
+                self.last_activity = time.monotonic()
+            if self.callback is not None:
+                self.callback(self.last)
+
+    def _build(self, done):
+        # out_time_ms у ffmpeg на самом деле в микросекундах
+        out_time_us = _parse_int(self.fields.get('out_time_us')) \
+            or _parse_int(self.fields.get('out_time_ms'))
+        out_time = out_time_us / 1_000_000 if out_time_us and out_time_us > 0 else 0.0
+        speed = _parse_float(self.fields.get('speed'))
+        elapsed = time.monotonic() - self.started
+
+        percent = None
+        eta = None
+        if done:
+            percent = 100.0
+            eta = 0.0
+        elif self.duration:
+            percent = min(100.0, out_time / self.duration * 100)
+            remaining = max(0.0, self.duration - out_time)
+            if speed:
+                eta = remaining / speed
+            elif out_time > 0:
+                eta = remaining * elapsed / out_time
+
+        return {
+            'out_time': out_time,
+            'duration': self.duration,
+            'percent': percent,
+            'eta': eta,
+            'fps': _parse_float(self.fields.get('fps')),
+            'speed': speed,
+            'total_size': _parse_int(self.fields.get('total_size')),
+            'elapsed': elapsed,
+            'done': done,
+        }
+
+
+class StderrBuffer:
+    MAX_LINE_LENGTH = 2000
+
+    def __init__(self, max_lines=100, spill_path=None):
+        self.lines = deque(maxlen=max_lines)
+        self.total_lines = 0
+        self.spill_path = spill_path
+        self.spill_file = None
+        if spill_path:
+            self.spill_file = open(spill_path, 'w', encoding='utf-8')
+
+    def append(self, line):
+        if self.spill_file is not None:
+            self.spill_file.write(line)
+        line = line.rstrip()
+        if not line:
+            return
+        if len(line) > self.MAX_LINE_LENGTH:
+            line = line[:self.MAX_LINE_LENGTH] + '…'
+        self.lines.append(line)
+        self.total_lines += 1
+
+    def tail(self, count=None):
+        lines = list(self.lines)
+        if count is not None:
+            lines = lines[-count:]
+        return lines
+
+    def text(self, count=None):
+        return '\n'.join(self.tail(count))
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def __str__(self):
+        return self.text()
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+class ConversionAborted(Exception):
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+def kill_process_tree(process):
+    try:
+        if os.name == 'posix':
+            # процесс запущен в своей сессии, pgid совпадает с pid
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class JobControl:
+    def __init__(self, stall_timeout=None, max_runtime=None):
+        self.stall_timeout = stall_timeout or None
+        self.max_runtime = max_runtime or None
+        # время выполнения отсчитывается с первого процесса ffmpeg, а не с создания:
+        # ожидание допуска планировщика в max_runtime не входит
+        self.started = None
+        self.status = None
+        self.reason = None
+        # бюджет потоков ffmpeg, выданный планировщиком
+        self.threads = None
+        # связанные задания (пробные кодирования) отменяются вместе с этим
+        self.linked = ControlRegistry()
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    @property
+    def aborted(self):
+        return self.status is not None
+
+    def attach(self, process):
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+            self._processes.add(process)
+            aborted = self.status is not None
+        if aborted:
+            kill_process_tree(process)
+
+    def detach(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def abort(self, status, reason):
+        with self._lock:
+            if self.status is not None:
+                return
+            self.status = status
+            self.reason = reason
+            processes = list(self._processes)
+        for process in processes:
+            kill_process_tree(process)
+
+    def cancel(self):
+        self.abort('cancelled', "Операция отменена пользователем")
+        self.linked.cancel_all()
+
+    def poll(self, last_activity):
+        now = time.monotonic()
+        if self.max_runtime and self.started is not None \
+                and now - self.started > self.max_runtime:
+            self.abort('timeout',
+                       f"Превышено максимальное время выполнения ({self.max_runtime:.0f} с)")
+        elif self.stall_timeout and now - last_activity > self.stall_timeout:
+            self.abort('timeout',
+                       f"FFmpeg не показывает прогресса {self.stall_timeout:.0f} с, процесс остановлен")
+
+    def raise_if_aborted(self):
+        if self.status is not None:
+            raise ConversionAborted(self.status, self.reason)
+
+
+class ControlRegistry:
+    def __init__(self):
+        self.controls = set()
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def register(self, control):
+        with self._lock:
+            self.controls.add(control)
+            cancelled = self.cancelled
+        if cancelled:
+            control.cancel()
+        return control
+
+    def unregister(self, control):
+        with self._lock:
+            self.controls.discard(control)
+
+    def cancel_all(self):
+        # задачи, которые успеют стартовать после отмены, регистрируются уже отмененными
+        with self._lock:
+            self.cancelled = True
+            controls = list(self.controls)
+        for control in controls:
+            control.cancel()
+        return len(controls)
+
+
+def apply_threads(cmd, threads):
+    if not threads:
+        return list(cmd)
+    # -threads — опция выхода: ставим ее перед каждым выходным файлом
+    result = []
+    for arg in cmd:
+        if arg == '-y':
+            result.extend(['-threads', str(threads)])
+        result.append(arg)
+    return result
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def run_ffmpeg(cmd, duration=None, progress_callback=None, stderr_lines=100, stderr_spill_path=None,
+               control=None):
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+    parser = ProgressParser(duration, progress_callback)
+    stderr = StderrBuffer(stderr_lines, stderr_spill_path)
+    if control is not None:
+        control.raise_if_aborted()
+
+    try:
+        process = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, encoding='utf-8', errors='ignore', bufsize=1,
+            start_new_session=os.name == 'posix')
+    except OSError:
+        stderr.close()
+        raise
+
+    def drain_stderr():
+        for line in process.stderr:
+            stderr.append(line)
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+
+    finished = threading.Event()
+    watchdog = None
+    if control is not None:
+        control.attach(process)
+
+        def watch():
+            while not finished.wait(0.5):
+                control.poll(parser.last_activity)
+
+        watchdog = threading.Thread(target=watch, daemon=True)
+        watchdog.start()
+
+    try:
+        for line in process.stdout:
+            parser.feed(line)
+        process.wait()
+    finally:
+        finished.set()
+        if process.poll() is None:
+            kill_process_tree(process)
+            process.wait()
+        if control is not None:
+            control.detach(process)
+            watchdog.join()
+        stderr_thread.join()
+        process.stdout.close()
+        process.stderr.close()
+        stderr.close()
+
+    if control is not None:
+        control.raise_if_aborted()
+    return process.returncode, stderr
+
+
+async def run_ffmpeg_async(cmd, duration=None, progress_callback=None, stderr_lines=100,
+                           stderr_spill_path=None, control=None):
+    import asyncio
+
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+    parser = ProgressParser(duration, progress_callback)
+    stderr = StderrBuffer(stderr_lines, stderr_spill_path)
+    if control is not None:
+        control.raise_if_aborted()
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            limit=1024 * 1024, start_new_session=os.name == 'posix')
+    except OSError:
+        stderr.close()
+        raise
+
+    async def pump(stream, handle):
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            handle(line.decode('utf-8', errors='ignore'))
+
+    async def watch():
+        while True:
+            await asyncio.sleep(0.5)
+            control.poll(parser.last_activity)
+
+    watchdog = None
+    if control is not None:
+        control.attach(process)
+        watchdog = asyncio.ensure_future(watch())
+
+    try:
+        await asyncio.gather(pump(process.stdout, parser.feed),
+                             pump(process.stderr, stderr.append))
+        await process.wait()
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+            control.detach(process)
+        if process.returncode is None:
+            kill_process_tree(process)
+            await asyncio.shield(process.wait())
+        stderr.close()
+
+    if control is not None:
+        control.raise_if_aborted()
+    return process.returncode, stderr
@@ -0,0 +1,205 @@
+import os
+import time
+import socket
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from ffmpeg_runner import ControlRegistry
+
+
+class JobDispatcher:
+    # допуск на расхождение длительности, при котором готовый файл считается полным
+    DURATION_TOLERANCE = 1.0
+
+    def __init__(self, converter, settings_db, max_workers=None, lease_seconds=60.0,
+                 poll_interval=1.0, worker_id=None):
+        self.converter = converter
+        self.settings_db = settings_db
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.logger = logging.getLogger(__name__)
+
+        self.stop_event = threading.Event()
+        self.slots = threading.BoundedSemaphore(self.max_workers)
+        self.running_lock = threading.Lock()
+        self.running = set()
+        self.controls = ControlRegistry()
+
+    def submit(self, job, priority=0, max_attempts=3):
+        job = self.converter._normalize_job(job)
+        # очередь переживает перезапуск, поэтому относительные пути фиксируются сразу
+        job['input_file'] = os.path.abspath(job['input_file'])
+        if job['output_path']:
+            job['output_path'] = os.path.abspath(job['output_path'])
+        job_id, created = self.settings_db.add_job(job, priority, max_attempts)
+        if not created:
+            self.logger.info(
+                f"Задача уже в очереди или выполнена: {job['input_file']} (#{job_id})")
+        return job_id
+
+    def _owner_alive(self, worker):
+        host, _, pid = (worker or '').rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit():
+            # чужая машина или свой формат worker_id: остается только ждать истечения аренды
+            return True
+        pid = int(pid)
+        if pid == os.getpid():
+            # тот же pid у прошлого запуска: наши задачи все в self.running
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _orphaned_jobs(self):
+        with self.running_lock:
+            own = set(self.running)
+        return [job['id'] for job in self.settings_db.get_jobs(['running'], limit=1000)
+                if job['id'] not in own and not self._owner_alive(job['worker'])]
+
+    def recover(self):
+        requeued = self.settings_db.requeue_expired_jobs()
+        if requeued:
+            self.logger.info(
+                f"Возвращено в очередь задач с истекшей арендой: {requeued}")
+
+        # после падения на этой же машине не ждем истечения аренды: владелец уже мертв
+        orphaned = self._orphaned_jobs()
+        if orphaned:
+            count = self.settings_db.requeue_jobs(
+                orphaned, 'Обработчик завершился, не закончив задачу')
+            self.logger.info(f"Возвращено в очередь задач без живого обработчика: {count}")
+            requeued += count
+        return requeued
+
+    def _output_file(self, job):
+        return self.converter.get_output_file(
+            job['input_file'], job['output_format'], job['output_path'])
+
+    def is_complete(self, job):
+        output_file = self._output_file(job)
+        if not os.path.isfile(output_file) or os.path.getsize(output_file) == 0:
+            return False
+        if os.path.getmtime(output_file) < os.path.getmtime(job['input_file']):
+            return False
+
+        source = self.converter.probe.probe(job['input_file'])
+        result = self.converter.probe.probe(output_file)
+        if not source or not result or not source.get('duration') or not result.get('duration'):
+            return False
+        return abs(source['duration'] - result['duration']) <= self.DURATION_TOLERANCE
+
+    def _heartbeat(self):
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self.stop_event.wait(interval):
+            with self.running_lock:
+                job_ids = list(self.running)
+            if job_ids:
+                try:
+                    self.settings_db.heartbeat_jobs(
+                        job_ids, self.worker_id, time.time() + self.lease_seconds)
+                except Exception as e:
+                    self.logger.error(f"Не удалось продлить аренду задач: {e}")
+
+    def _process(self, job):
+        control = self.controls.register(self.converter.new_control())
+        try:
+            if os.path.isfile(job['input_file']) and self.is_complete(job):
+                output_file = self._output_file(job)
+                message = f"Результат уже записан полностью, пропуск: {output_file}"
+                self.logger.info(message)
+                self.settings_db.finish_job(
+                    job['id'], self.worker_id, True, message, output_file)
+                return
+
+            result = self.converter._run_job(self.converter._normalize_job(job),
+                                             control=control)
+            success, message = result
+            self.converter.record_result(self.settings_db, job, success, message,
+                                         details=result.details)
+            if control.status == 'cancelled':
+                # остановка диспетчера — не ошибка задачи: попытка возвращается
+                self.settings_db.requeue_cancelled_job(job['id'], self.worker_id, message)
+                return
+
+            self.settings_db.finish_job(
+                job['id'], self.worker_id, success, message,
+                self._output_file(job) if success else None)
+            if not success and job['attempts'] < job['max_attempts']:
+                self.logger.warning(
+                    f"Задача #{job['id']} будет повторена "
+                    f"(попытка {job['attempts']} из {job['max_attempts']})")
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка обработки задачи #{job['id']}: {e}", exc_info=True)
+            self.settings_db.finish_job(
+                job['id'], self.worker_id, False, f"Системная ошибка: {str(e)}")
+        finally:
+            self.controls.unregister(control)
+            with self.running_lock:
+                self.running.discard(job['id'])
+            self.slots.release()
+
+    def _claim(self):
+        job = self.settings_db.claim_job(
+            self.worker_id, time.time() + self.lease_seconds)
+        if job is not None:
+            with self.running_lock:
+                self.running.add(job['id'])
+        return job
+
+    def stop(self):
+        self.stop_event.set()
+        self.controls.cancel_all()
+
+    def run(self, until_idle=False):
+        self.recover()
+        self.logger.info(
+            f"Диспетчер очереди запущен ({self.worker_id}, потоков: {self.max_workers})")
+
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        last_recover = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                if not self.slots.acquire(timeout=self.poll_interval):
+                    continue
+
+                job = self._claim()
+                if job is None:
+                    self.slots.release()
+                    with self.running_lock:
+                        idle = not self.running
+                    leased = False
+                    if until_idle and idle:
+                        if not self.settings_db.get_job_counts().get('running'):
+                            break
+                        # задачи в аренде у другого обработчика: ждем, пока он их закончит
+                        # или аренда истечет, иначе они останутся невыполненными
+                        leased = True
+                    self.stop_event.wait(self.poll_interval)
+                    if leased or time.monotonic() - last_recover >= self.lease_seconds:
+                        self.recover()
+                        last_recover = time.monotonic()
+                    continue
+
+                self.logger.info(
+                    f"Задача #{job['id']}: {job['input_file']} -> {job['output_format']}")
+                executor.submit(self._process, job)
+        except BaseException:
+            # ffmpeg в своей сессии не получает Ctrl-C: без отмены shutdown ждал бы конца кодирования
+            self.stop()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+            self.stop_event.set()
+            heartbeat.join()
+            self.logger.info(
+                f"Диспетчер очереди остановлен: {self.settings_db.get_job_counts()}")
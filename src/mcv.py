@@ -1,228 +1,199 @@
 import os
-import subprocess
-import shutil
-import logging
-from PyQt6.QtCore import QThread, pyqtSignal
-
-
-class MediaConverter:
-    def __init__(self):
-        self.supported_video_formats = [
-            'mp4', 'avi', 'mkv', 'mov', 'webm', 'flv', 'wmv']
-        self.supported_audio_formats = [
-            'mp3', 'wav', 'aac', 'flac', 'ogg', 'm4a']
-        self.logger = logging.getLogger(__name__)
-        self.ffmpeg_available = self._check_ffmpeg()
-
-    def _check_ffmpeg(self):
-        ffmpeg_path = shutil.which("ffmpeg")
-        if ffmpeg_path is None:
-            self.logger.error("FFmpeg не найден в системе")
-            return False
-
-        try:
-            result = subprocess.run(
-                [ffmpeg_path, '-version'], capture_output=True, text=True, check=True)
-            self.logger.info(
-                f"FFmpeg доступен: {result.stdout.splitlines()[0] if result.stdout else 'Неизвестная версия'}")
-            return True
-        except subprocess.CalledProcessError as e:
-            self.logger.error(f"Ошибка проверки FFmpeg: {e}")
-            return False
-        except Exception as e:
-            self.logger.error(f"Неожиданная ошибка при проверке FFmpeg: {e}")
-            return False
-
-    def convert_video(self, input_file, output_format='mp4', output_path=None, quality=8):
-        if not os.path.isfile(input_file):
-            error_msg = f"Файл {input_file} не найден"
-            self.logger.error(error_msg)
-            return False, error_msg
-
-        try:
-            if output_path is None:
-                output_path = os.path.dirname(input_file)
-            else:
-                os.makedirs(output_path, exist_ok=True)
-
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_file = os.path.join(
-                output_path, f"{base_name}.{output_format}")
-
-            self.logger.info(
-                f"Конвертация видео: {input_file} -> {output_file}, качество: {quality}")
-
-            cmd = ['ffmpeg', '-i', input_file]
-
-            if quality < 10:
-                if output_format == 'mp4':
-                    cmd.extend(
-                        ['-c:v', 'libx264', '-crf', str(23 - quality * 2)])
-                elif output_format in ['webm', 'mkv']:
-                    cmd.extend(
-                        ['-c:v', 'libvpx-vp9', '-crf', str(31 - quality * 3)])
-                else:
-                    cmd.extend(['-c', 'copy'])
-            else:
-                cmd.extend(['-c', 'copy'])
-
-            cmd.extend(['-y', output_file])
-
-            self.logger.debug(f"Выполняемая команда: {' '.join(cmd)}")
-
-            try:
-                result = subprocess.run(
-                    cmd, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-
-                if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-                    success_msg = f"Конвертация успешно завершена: {output_file}"
-                    self.logger.info(success_msg)
-                    return True, success_msg
-                else:
-                    error_msg = "Выходной файл не был создан"
-                    self.logger.error(error_msg)
-                    return False, error_msg
-
-            except subprocess.CalledProcessError as e:
-                error_msg = f"Ошибка конвертации: {e.stderr}"
-                self.logger.error(error_msg)
-                if e.stderr:
-                    error_lines = [line for line in e.stderr.split(
-                        '\n') if line.strip()]
-                    for line in error_lines[-10:]:
-                        self.logger.error(f"FFmpeg: {line}")
-
-                if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-                    warning_msg = f"Конвертация завершена (с предупреждениями): {output_file}"
-                    self.logger.warning(warning_msg)
-                    return True, warning_msg
-                return False, error_msg
-
-            except FileNotFoundError:
-                error_msg = "FFmpeg не найден. Установите FFmpeg."
-                self.logger.error(error_msg)
-                return False, error_msg
-
-        except Exception as e:
-            error_msg = f"Системная ошибка: {str(e)}"
-            self.logger.error(error_msg, exc_info=True)
-            return False, error_msg
-
-    def extract_audio(self, input_file, output_format='mp3', output_path=None, quality=8):
-        if not os.path.isfile(input_file):
-            error_msg = f"Файл {input_file} не найден"
-            self.logger.error(error_msg)
-            return False, error_msg
-
+import sys
+import signal
+import argparse
+
+
+VIDEO_FORMATS = ['mp4', 'avi', 'mkv', 'mov', 'webm', 'flv', 'wmv']
+AUDIO_FORMATS = ['mp3', 'wav', 'aac', 'flac', 'ogg', 'm4a']
+SPEED_PROFILES = ['fastest', 'balanced', 'archival']
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='mcv',
+        description="Конвертация видеофайлов и извлечение аудио дорожек. "
+                    "Результаты выводятся построчно в формате JSON.")
+    parser.add_argument('inputs', nargs='*',
+                        help="Входные файлы или шаблоны (например, 'videos/**/*.avi')")
+    parser.add_argument('--audio', action='store_true',
+                        help="Извлечь аудио вместо конвертации видео")
+    parser.add_argument('--format', dest='output_format',
+                        choices=VIDEO_FORMATS + AUDIO_FORMATS,
+                        help="Выходной формат (по умолчанию mp4 для видео, mp3 для аудио)")
+    parser.add_argument('--output', dest='output_path',
+                        help="Папка для сохранения (по умолчанию папка исходного файла)")
+    parser.add_argument('--quality', type=int, default=8, choices=range(1, 11), metavar='1-10',
+                        help="Качество конвертации (по умолчанию 8)")
+    parser.add_argument('--speed', dest='speed_profile', choices=SPEED_PROFILES,
+                        help="Профиль скорости кодирования (по умолчанию из настроек или balanced)")
+    parser.add_argument('--realtime', type=float, metavar='X',
+                        help="Подобрать качество и профиль пробным кодированием так, "
+                             "чтобы видео кодировалось не медленнее X× реального времени")
+    parser.add_argument('--deadline', type=float, metavar='HOURS',
+                        help="Подобрать качество и профиль так, чтобы вся пачка "
+                             "уложилась в заданное число часов")
+    parser.add_argument('--workers', type=int,
+                        help="Максимум одновременных конвертаций (по умолчанию число ядер)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Допускать новые конвертации по загрузке процессора и свободной памяти "
+                             "и выдавать каждой свой бюджет потоков ffmpeg")
+    parser.add_argument('--segmented', action='store_true',
+                        help="Кодировать длинные видео параллельными сегментами")
+    parser.add_argument('--target-size', type=float, metavar='MB',
+                        help="Двухпроходное кодирование под заданный размер файла в МБ")
+    parser.add_argument('--target-bitrate', type=int, metavar='KBPS',
+                        help="Двухпроходное кодирование с заданным общим битрейтом в кбит/с")
+    parser.add_argument('--watch', action='store_true',
+                        help="Следить за указанными папками и конвертировать новые файлы")
+    parser.add_argument('--queue', action='store_true',
+                        help="Поставить файлы в постоянную очередь и обработать ее; "
+                             "после перезапуска незавершенные задачи продолжаются")
+    parser.add_argument('--db', help="База настроек для кэша анализа, кэша результатов и истории")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="Подробный лог в stderr")
+    return parser
+
+
+def expand_inputs(patterns):
+    import glob
+
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                yield pattern
+            for match in matches:
+                if os.path.isfile(match):
+                    yield match
+        else:
+            yield pattern
+
+
+def make_job(input_file, args, operation_type):
+    return {
+        'input_file': input_file,
+        'output_format': args.output_format,
+        'output_path': args.output_path,
+        'operation_type': operation_type,
+        'quality': args.quality,
+        'segmented': args.segmented,
+        'target_size': int(args.target_size * 1024 * 1024) if args.target_size else None,
+        'target_bitrate': args.target_bitrate,
+        'speed_profile': args.speed_profile,
+        'realtime': args.realtime,
+    }
+
+
+def open_settings(db_path=None):
+    import atexit
+    from database import SettingsDB
+
+    settings_db = SettingsDB(db_path) if db_path else SettingsDB()
+    # в пачках история пишется в фоне пачками и дописывается при выходе
+    settings_db.start_history_recorder()
+    atexit.register(settings_db.stop_history_recorder)
+    return settings_db
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    # SIGTERM (остановка службы) проходит ту же отмену ffmpeg, что и Ctrl-C
+    signal.signal(signal.SIGTERM, interrupt)
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.queue:
+        parser.error("укажите входные файлы")
+
+    import json
+    import logging
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        stream=sys.stderr)
+
+    from converter import MediaConverter
+
+    settings_db = None
+    if args.db:
+        settings_db = open_settings(args.db)
+
+    scheduler = None
+    if args.adaptive:
+        from scheduler import ResourceScheduler
+        scheduler = ResourceScheduler(max_jobs=args.workers)
+
+    converter = MediaConverter(settings_db, scheduler=scheduler)
+    if not converter.ffmpeg_available:
+        print(json.dumps({'success': False, 'message': "FFmpeg не найден. Установите FFmpeg."},
+                         ensure_ascii=False))
+        return 2
+
+    operation_type = 'audio' if args.audio else 'video'
+    inputs = args.inputs
+
+    if args.deadline and not args.watch:
+        inputs = list(expand_inputs(args.inputs))
+        durations = converter.probe.probe_many(inputs)
+        total = sum(info.get('duration') or 0 for info in durations.values())
+        workers = args.workers or os.cpu_count() or 1
+        # пачка идет в несколько потоков, каждой задаче хватает своей доли скорости
+        needed = total / (args.deadline * 3600) / workers
+        args.realtime = max(args.realtime or 0, needed) or None
+
+    if args.watch:
+        if settings_db is None:
+            settings_db = open_settings()
+        from watcher import WatchFolderDaemon
+
+        daemon = WatchFolderDaemon(converter, settings_db, args.inputs, operation_type,
+                                   args.output_format, args.workers)
         try:
-            if output_path is None:
-                output_path = os.path.dirname(input_file)
-            else:
-                os.makedirs(output_path, exist_ok=True)
-
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_file = os.path.join(
-                output_path, f"{base_name}.{output_format}")
-
-            self.logger.info(
-                f"Извлечение аудио: {input_file} -> {output_file}, качество: {quality}")
-
-            cmd = ['ffmpeg', '-i', input_file, '-vn']
-
-            if output_format == 'mp3':
-                mp3_quality = 9 - min(9, max(0, quality - 1))
-                cmd.extend(['-acodec', 'libmp3lame', '-q:a', str(mp3_quality)])
-            elif output_format == 'flac':
-                cmd.extend(['-acodec', 'flac', '-compression_level',
-                           str(min(12, max(0, quality)))])
-            else:
-                if quality >= 8:
-                    cmd.extend(['-acodec', 'copy'])
-                else:
-                    cmd.extend(['-acodec', 'aac', '-b:a',
-                               f'{64 + quality * 16}k'])
-
-            cmd.extend(['-y', output_file])
-
-            self.logger.debug(f"Выполняемая команда: {' '.join(cmd)}")
-
-            try:
-                result = subprocess.run(
-                    cmd, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-                    success_msg = f"Аудио извлечено успешно: {output_file}"
-                    self.logger.info(success_msg)
-                    return True, success_msg
-                else:
-                    error_msg = "Выходной файл не был создан"
-                    self.logger.error(error_msg)
-                    return False, error_msg
-            except subprocess.CalledProcessError as e:
-                error_msg = f"Ошибка извлечения аудио: {e.stderr}"
-                self.logger.error(error_msg)
-                if e.stderr:
-                    error_lines = [line for line in e.stderr.split(
-                        '\n') if line.strip()]
-                    for line in error_lines[-10:]:
-                        self.logger.error(f"FFmpeg: {line}")
-
-                if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-                    warning_msg = f"Аудио извлечено (с предупреждениями): {output_file}"
-                    self.logger.warning(warning_msg)
-                    return True, warning_msg
-                return False, error_msg
-            except FileNotFoundError:
-                error_msg = "FFmpeg не найден. Установите FFmpeg."
-                self.logger.error(error_msg)
-                return False, error_msg
-
-        except Exception as e:
-            error_msg = f"Системная ошибка: {str(e)}"
-            self.logger.error(error_msg, exc_info=True)
-            return False, error_msg
-
-
-class ConversionThread(QThread):
-    finished = pyqtSignal(bool, str)
-    progress = pyqtSignal(int)
-
-    def __init__(self, converter, input_file, output_format, output_path, operation_type, quality):
-        super().__init__()
-        self.converter = converter
-        self.input_file = input_file
-        self.output_format = output_format
-        self.output_path = output_path
-        self.operation_type = operation_type
-        self.quality = quality
-        self.logger = logging.getLogger(__name__)
-
-    def run(self):
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.stop()
+        return 0
+
+    if args.queue:
+        if settings_db is None:
+            settings_db = open_settings()
+        from job_queue import JobDispatcher
+
+        dispatcher = JobDispatcher(converter, settings_db, args.workers)
+        for input_file in expand_inputs(inputs):
+            dispatcher.submit(make_job(input_file, args, operation_type))
         try:
-            self.logger.info(f"Начало операции: {self.operation_type}")
-            self.logger.info(f"Входной файл: {self.input_file}")
-            self.logger.info(f"Выходной формат: {self.output_format}")
-            self.logger.info(f"Путь сохранения: {self.output_path}")
-            self.logger.info(f"Качество: {self.quality}")
-
-            if self.operation_type == 'video':
-                result = self.converter.convert_video(
-                    self.input_file, self.output_format, self.output_path, self.quality
-                )
-            else:
-                result = self.converter.extract_audio(
-                    self.input_file, self.output_format, self.output_path, self.quality
-                )
-
-            success, message = result
-
-            if success:
-                self.logger.info(f"Операция завершена успешно: {message}")
-            else:
-                self.logger.error(f"Ошибка операции: {message}")
-
-            self.finished.emit(success, message)
-
-        except Exception as e:
-            error_msg = f"Неожиданная ошибка в потоке конвертации: {str(e)}"
-            self.logger.error(error_msg, exc_info=True)
-            self.finished.emit(False, error_msg)
+            dispatcher.run(until_idle=True)
+        except KeyboardInterrupt:
+            dispatcher.stop()
+        counts = settings_db.get_job_counts()
+        print(json.dumps({'jobs': counts}, ensure_ascii=False), flush=True)
+        return 1 if counts.get('failed') else 0
+
+    jobs = (make_job(input_file, args, operation_type)
+            for input_file in expand_inputs(inputs))
+
+    failed = 0
+    for job, result in converter.convert_many(jobs, args.workers, settings_db):
+        success, message = result
+        if not success:
+            failed += 1
+        record = {
+            'input': job['input_file'],
+            'output': converter.get_output_file(
+                job['input_file'], job['output_format'], job['output_path']) if success else None,
+            'success': success,
+            'message': message,
+        }
+        record.update(getattr(result, 'details', {}))
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import os
+import json
+import shutil
+import subprocess
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+
+MEDIA_EXTENSIONS = {
+    '.mp4', '.avi', '.mkv', '.mov', '.webm', '.flv', '.wmv', '.m4v', '.mpg', '.mpeg', '.ts',
+    '.mp3', '.wav', '.aac', '.flac', '.ogg', '.m4a', '.opus', '.wma'
+}
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _parse_rate(value):
+    if not value or value == '0/0':
+        return None
+    if '/' in value:
+        num, den = value.split('/', 1)
+        num, den = _to_float(num), _to_float(den)
+        if num is None or not den:
+            return None
+        return round(num / den, 3)
+    return _to_float(value)
+
+
+def parse_ffprobe_output(data):
+    fmt = data.get('format', {})
+    streams = []
+    video_codec = audio_codec = None
+    width = height = None
+
+    for stream in data.get('streams', []):
+        codec_type = stream.get('codec_type')
+        tags = stream.get('tags', {})
+        info = {
+            'index': stream.get('index'),
+            'codec_type': codec_type,
+            'codec_name': stream.get('codec_name'),
+            'language': tags.get('language'),
+            'bit_rate': _to_int(stream.get('bit_rate')),
+        }
+        if codec_type == 'video':
+            if stream.get('disposition', {}).get('attached_pic'):
+                continue
+            info.update({
+                'width': stream.get('width'),
+                'height': stream.get('height'),
+                'pix_fmt': stream.get('pix_fmt'),
+                'fps': _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate')),
+            })
+            if video_codec is None:
+                video_codec = info['codec_name']
+                width, height = info['width'], info['height']
+        elif codec_type == 'audio':
+            info.update({
+                'channels': stream.get('channels'),
+                'channel_layout': stream.get('channel_layout'),
+                'sample_rate': _to_int(stream.get('sample_rate')),
+            })
+            if audio_codec is None:
+                audio_codec = info['codec_name']
+        streams.append(info)
+
+    return {
+        'format_name': fmt.get('format_name'),
+        'duration': _to_float(fmt.get('duration')),
+        'bit_rate': _to_int(fmt.get('bit_rate')),
+        'width': width,
+        'height': height,
+        'video_codec': video_codec,
+        'audio_codec': audio_codec,
+        'streams': streams,
+    }
+
+
+def describe(info):
+    if not info:
+        return ""
+
+    parts = []
+    if info.get('video_codec'):
+        video = info['video_codec'].upper()
+        if info.get('width') and info.get('height'):
+            video += f" {info['width']}x{info['height']}"
+        parts.append(video)
+    if info.get('audio_codec'):
+        audio_count = sum(1 for s in info.get('streams', [])
+                          if s['codec_type'] == 'audio')
+        audio = info['audio_codec'].upper()
+        if audio_count > 1:
+            audio += f" (+{audio_count - 1})"
+        parts.append(audio)
+    if info.get('duration'):
+        seconds = int(info['duration'])
+        parts.append(
+            f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}")
+    if info.get('bit_rate'):
+        parts.append(f"{info['bit_rate'] / 1_000_000:.1f} Мбит/с")
+    return ", ".join(parts)
+
+
+class MediaProbe:
+    def __init__(self, settings_db=None, max_memory_entries=4096):
+        self.settings_db = settings_db
+        self.max_memory_entries = max_memory_entries
+        self.logger = logging.getLogger(__name__)
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._ffprobe_path = shutil.which("ffprobe")
+
+    def _key(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def _remember(self, key, info):
+        with self._lock:
+            if len(self._memory) >= self.max_memory_entries:
+                self._memory.pop(next(iter(self._memory)))
+            self._memory[key] = info
+
+    def _lookup(self, key):
+        with self._lock:
+            info = self._memory.get(key)
+        if info is not None or self.settings_db is None:
+            return info
+
+        info = self.settings_db.get_media_probe(*key)
+        if info is not None:
+            self._remember(key, info)
+        return info
+
+    def _run_ffprobe(self, path):
+        if self._ffprobe_path is None:
+            return None
+
+        try:
+            result = subprocess.run(
+                [self._ffprobe_path, '-v', 'error', '-print_format', 'json',
+                 '-show_format', '-show_streams', path],
+                capture_output=True, text=True, encoding='utf-8', errors='ignore')
+        except OSError as e:
+            self.logger.error(f"Не удалось запустить ffprobe: {e}")
+            return None
+
+        if result.returncode != 0:
+            self.logger.warning(
+                f"ffprobe не смог прочитать {path}: {result.stderr.strip()[-500:]}")
+            return None
+
+        try:
+            return parse_ffprobe_output(json.loads(result.stdout or '{}'))
+        except json.JSONDecodeError as e:
+            self.logger.warning(f"Некорректный ответ ffprobe для {path}: {e}")
+            return None
+
+    def _probe_key(self, key):
+        info = self._run_ffprobe(key[0])
+        if info is None:
+            return None
+        info.update({
+            'path': key[0],
+            'size': key[1],
+            'mtime_ns': key[2],
+            'probed_at': datetime.now().isoformat(),
+        })
+        self._remember(key, info)
+        return info
+
+    def probe(self, path):
+        key = self._key(path)
+        if key is None:
+            return None
+
+        info = self._lookup(key)
+        if info is not None:
+            return info
+
+        info = self._probe_key(key)
+        if info is not None and self.settings_db is not None:
+            self.settings_db.save_media_probe(info)
+        return info
+
+    def cached(self, path):
+        key = self._key(path)
+        if key is not None:
+            return self._lookup(key)
+        if self.settings_db is not None:
+            return self.settings_db.get_media_probe(os.path.abspath(path))
+        return None
+
+    def get_duration(self, path):
+        info = self.probe(path)
+        return info.get('duration') if info else None
+
+    def probe_many(self, paths, max_workers=None, batch_size=100):
+        if max_workers is None:
+            max_workers = min(16, (os.cpu_count() or 1) * 2)
+
+        results = {}
+        to_probe = []
+        for path in paths:
+            key = self._key(path)
+            if key is None:
+                continue
+            info = self._lookup(key)
+            if info is not None:
+                results[path] = info
+            else:
+                to_probe.append((path, key))
+
+        if to_probe:
+            self.logger.info(
+                f"Анализ файлов: {len(to_probe)} новых, {len(results)} из кэша")
+
+        batch = []
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {executor.submit(self._probe_key, key): path
+                       for path, key in to_probe}
+            for future in as_completed(futures):
+                info = future.result()
+                if info is None:
+                    continue
+                results[futures[future]] = info
+                batch.append(info)
+                if self.settings_db is not None and len(batch) >= batch_size:
+                    self.settings_db.save_media_probes(batch)
+                    batch = []
+
+        if self.settings_db is not None and batch:
+            self.settings_db.save_media_probes(batch)
+
+        return results
+
+    def probe_directory(self, directory, recursive=True, max_workers=None):
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+            if not recursive:
+                break
+        return self.probe_many(paths, max_workers)
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+SAMPLE_SIZE = 4 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.mcv_cache')
+DEFAULT_CACHE_MAX_MB = 10240
+# ioctl клонирования файла (btrfs, xfs): копия без копирования данных
+FICLONE = 0x40049409
+
+
+def fast_file_hash(path, sample_size=SAMPLE_SIZE):
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(size).encode())
+
+    with open(path, 'rb') as f:
+        if size <= sample_size * 3:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        else:
+            for offset in (0, size // 2 - sample_size // 2, size - sample_size):
+                f.seek(offset)
+                digest.update(f.read(sample_size))
+
+    return digest.hexdigest()
+
+
+def _clone_or_copy(source, destination):
+    # только отдельный inode: через жесткую ссылку ffmpeg -y поверх выходного файла
+    # переписал бы и артефакт кэша
+    partial = f"{destination}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(source, 'rb') as src, open(partial, 'wb') as dst:
+            cloned = False
+            if fcntl is not None:
+                try:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                    cloned = True
+                except OSError:
+                    pass
+            if not cloned:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        shutil.copystat(source, partial)
+        os.replace(partial, destination)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+
+
+class ConversionCache:
+    def __init__(self, settings_db, cache_dir=None):
+        self.settings_db = settings_db
+        self.cache_dir = cache_dir
+        self.logger = logging.getLogger(__name__)
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.settings_db.get_bool("use_cache", False)
+
+    @property
+    def directory(self):
+        return self.cache_dir or self.settings_db.get_value("cache_dir", "") or DEFAULT_CACHE_DIR
+
+    @property
+    def max_bytes(self):
+        return self.settings_db.get_int("cache_max_mb", DEFAULT_CACHE_MAX_MB) * 1024 * 1024
+
+    def _content_hash(self, input_file):
+        stat = os.stat(input_file)
+        key = (os.path.abspath(input_file), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            content_hash = self._hashes.get(key)
+        if content_hash is None:
+            content_hash = fast_file_hash(input_file)
+            with self._lock:
+                self._hashes[key] = content_hash
+        return content_hash
+
+    def make_key(self, input_file, operation_type, output_format, args, ffmpeg_version=None):
+        params = json.dumps({
+            'operation_type': operation_type,
+            'format': output_format,
+            'args': list(args),
+            'ffmpeg': ffmpeg_version,
+        }, sort_keys=True)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self._content_hash(input_file).encode())
+        digest.update(params.encode())
+        return digest.hexdigest()
+
+    def _artifact_path(self, cache_key, output_format):
+        return os.path.join(self.directory, cache_key[:2], f"{cache_key}.{output_format}")
+
+    def fetch(self, cache_key, output_file):
+        entry = self.settings_db.get_cache_entry(cache_key)
+        if entry is None:
+            return None
+
+        try:
+            stat = os.stat(entry['path'])
+        except FileNotFoundError:
+            stat = None
+        # st_nlink > 1 — артефакт из старых версий, связанный с выходным файлом:
+        # его могли переписать на месте, и размер этого не покажет
+        if stat is None or stat.st_size != entry['size'] or stat.st_nlink > 1:
+            self.logger.warning(
+                f"Запись кэша повреждена, удаляется: {entry['path']}")
+            self._discard(cache_key, entry['path'])
+            return None
+
+        _clone_or_copy(entry['path'], output_file)
+        self.settings_db.touch_cache_entry(cache_key, time.time())
+        self.logger.info(f"Результат взят из кэша: {output_file}")
+        return entry
+
+    def store(self, cache_key, output_file, encode_seconds):
+        output_format = os.path.splitext(output_file)[1].lstrip('.')
+        artifact = self._artifact_path(cache_key, output_format)
+        size = os.path.getsize(output_file)
+
+        if size > self.max_bytes:
+            self.logger.info(
+                f"Файл больше лимита кэша, не кэшируется: {output_file}")
+            return
+
+        try:
+            os.makedirs(os.path.dirname(artifact), exist_ok=True)
+            _clone_or_copy(output_file, artifact)
+        except OSError as e:
+            self.logger.warning(f"Не удалось сохранить результат в кэш: {e}")
+            return
+
+        self.settings_db.put_cache_entry(
+            cache_key, artifact, size, encode_seconds, time.time())
+        self.evict()
+
+    def _discard(self, cache_key, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning(f"Не удалось удалить файл кэша {path}: {e}")
+        self.settings_db.delete_cache_entry(cache_key)
+
+    def evict(self):
+        count, total_size = self.settings_db.get_cache_usage()
+        budget = self.max_bytes
+
+        while total_size > budget and count > 0:
+            entries = self.settings_db.get_cache_lru()
+            if not entries:
+                break
+            for entry in entries:
+                if total_size <= budget:
+                    break
+                try:
+                    os.remove(entry['path'])
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    self.logger.warning(
+                        f"Не удалось удалить файл кэша {entry['path']}: {e}")
+                self.settings_db.delete_cache_entry(entry['cache_key'])
+                total_size -= entry['size']
+                count -= 1
+                self.logger.info(
+                    f"Удален из кэша (LRU): {os.path.basename(entry['path'])}")
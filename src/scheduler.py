@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+import logging
+
+
+MB = 1024 * 1024
+
+# примерный расход памяти кодировщика на пиксель кадра (lookahead, опорные кадры, буферы)
+ENCODER_MEMORY_PER_PIXEL = {
+    'libx264': 60,
+    'libx265': 110,
+    'libvpx-vp9': 80,
+    'libsvtav1': 140,
+    'libaom-av1': 160,
+}
+DEFAULT_MEMORY_PER_PIXEL = 40
+BASE_JOB_MEMORY = 100 * MB
+# на сколько пикселей кадра кодировщику имеет смысл давать один поток
+PIXELS_PER_THREAD = 250_000
+MAX_JOB_THREADS = 16
+# сколько секунд после запуска задача считается «разгоняющейся»: ее память еще не видна в MemAvailable
+RAMP_UP_SECONDS = 10.0
+
+
+def available_memory():
+    try:
+        with open('/proc/meminfo', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def load_average():
+    try:
+        return os.getloadavg()[0]
+    except (OSError, AttributeError):
+        return None
+
+
+def estimate_cost(probe_info, operation_type='video', encoder=None):
+    if operation_type != 'video' or encoder == 'copy':
+        return {'threads': 1, 'memory': BASE_JOB_MEMORY // 2, 'pixels': 0}
+
+    width = (probe_info or {}).get('width') or 1920
+    height = (probe_info or {}).get('height') or 1080
+    pixels = width * height
+    per_pixel = ENCODER_MEMORY_PER_PIXEL.get(encoder, DEFAULT_MEMORY_PER_PIXEL)
+    return {
+        'threads': max(2, min(MAX_JOB_THREADS, pixels // PIXELS_PER_THREAD)),
+        'memory': BASE_JOB_MEMORY + pixels * per_pixel,
+        'pixels': pixels,
+    }
+
+
+class Admission:
+    def __init__(self, scheduler, cost, threads):
+        self.scheduler = scheduler
+        self.cost = cost
+        self.threads = threads
+        self.started = time.monotonic()
+
+    def release(self):
+        self.scheduler.release(self)
+
+
+
+class ResourceScheduler:
+    def __init__(self, cpu_count=None, memory_reserve=None, max_jobs=None, poll_interval=1.0):
+        self.cpu_count = max(1, cpu_count or os.cpu_count() or 1)
+        # запас памяти, который кодировщики не должны занимать, чтобы система не ушла в своп
+        self.memory_reserve = memory_reserve if memory_reserve is not None \
+            else max(512 * MB, (available_memory() or 0) // 10)
+        self.max_jobs = max_jobs or self.cpu_count
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger(__name__)
+
+        self.condition = threading.Condition()
+        self.running = []
+
+    def _threads_in_use(self):
+        return sum(admission.threads for admission in self.running)
+
+    def _free_threads(self):
+        in_use = self._threads_in_use()
+        load = load_average()
+        # loadavg включает и наши кодировщики: вычитаем их, остаток — чужая нагрузка
+        external = max(0.0, load - in_use) if load is not None else 0.0
+        return int(self.cpu_count - in_use - external)
+
+    def _memory_headroom(self):
+        available = available_memory()
+        if available is None:
+            return None
+        now = time.monotonic()
+        ramping = sum(admission.cost['memory'] for admission in self.running
+                      if now - admission.started < RAMP_UP_SECONDS)
+        return available - ramping - self.memory_reserve
+
+    def _try_admit(self, cost):
+        if not self.running:
+            # одна задача допускается всегда, иначе очередь может встать навсегда
+            return Admission(self, cost, min(cost['threads'], self.cpu_count))
+        if len(self.running) >= self.max_jobs:
+            return None
+
+        free_threads = self._free_threads()
+        if free_threads < min(2, cost['threads']):
+            return None
+        memory = self._memory_headroom()
+        if memory is not None and memory < cost['memory']:
+            return None
+        return Admission(self, cost, max(1, min(cost['threads'], free_threads)))
+
+    def admit(self, cost, control=None):
+        with self.condition:
+            while True:
+                if control is not None and control.aborted:
+                    return None
+                admission = self._try_admit(cost)
+                if admission is not None:
+                    self.running.append(admission)
+                    self.logger.info(
+                        f"Задача допущена: потоков {admission.threads}, "
+                        f"память ~{cost['memory'] // MB} МБ, выполняется {len(self.running)}")
+                    return admission
+                # нагрузка и память меняются и без release, поэтому ждем с таймаутом
+                self.condition.wait(self.poll_interval)
+
+    def release(self, admission):
+        with self.condition:
+            if admission in self.running:
+                self.running.remove(admission)
+            self.condition.notify_all()
@@ -0,0 +1,308 @@
+# None означает, что контейнер принимает практически любой кодек
+VIDEO_CONTAINER_CODECS = {
+    'mp4': {'h264', 'hevc', 'mpeg4', 'av1', 'vp9'},
+    'mov': {'h264', 'hevc', 'mpeg4', 'prores', 'mjpeg'},
+    'mkv': None,
+    'webm': {'vp8', 'vp9', 'av1'},
+    'avi': {'mpeg4', 'h264', 'mjpeg', 'msmpeg4v2', 'msmpeg4v3'},
+    'flv': {'h264', 'flv1'},
+    'wmv': {'wmv1', 'wmv2', 'wmv3', 'vc1'},
+}
+
+AUDIO_CONTAINER_CODECS = {
+    'mp4': {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus', 'flac'},
+    'mov': {'aac', 'mp3', 'alac', 'ac3', 'pcm_s16le', 'pcm_s24le'},
+    'mkv': None,
+    'webm': {'opus', 'vorbis'},
+    'avi': {'mp3', 'ac3', 'pcm_s16le'},
+    'flv': {'aac', 'mp3'},
+    'wmv': {'wmav1', 'wmav2', 'mp3'},
+    'mp3': {'mp3'},
+    'wav': {'pcm_s16le', 'pcm_s24le', 'pcm_s32le', 'pcm_f32le', 'pcm_u8'},
+    'aac': {'aac'},
+    'flac': {'flac'},
+    'ogg': {'vorbis', 'opus', 'flac'},
+    'm4a': {'aac', 'alac'},
+}
+
+VIDEO_ENCODERS = {
+    'mp4': 'libx264',
+    'mov': 'libx264',
+    'mkv': 'libvpx-vp9',
+    'webm': 'libvpx-vp9',
+    'avi': 'mpeg4',
+    'flv': 'libx264',
+    'wmv': 'wmv2',
+}
+
+AUDIO_ENCODERS = {
+    'mp4': 'aac',
+    'mov': 'aac',
+    'mkv': 'aac',
+    'webm': 'libopus',
+    'avi': 'libmp3lame',
+    'flv': 'aac',
+    'wmv': 'wmav2',
+    'mp3': 'libmp3lame',
+    'wav': 'pcm_s16le',
+    'aac': 'aac',
+    'flac': 'flac',
+    'ogg': 'libvorbis',
+    'm4a': 'aac',
+}
+
+SPEED_PROFILES = ['fastest', 'balanced', 'archival']
+DEFAULT_SPEED_PROFILE = 'balanced'
+
+SPEED_PROFILE_LABELS = {
+    'fastest': "Быстрый",
+    'balanced': "Сбалансированный",
+    'archival': "Архивный",
+}
+
+X264_PRESETS = {'fastest': 'veryfast', 'balanced': 'medium', 'archival': 'slow'}
+# (-deadline, -cpu-used)
+VP9_SPEED = {'fastest': ('good', 5), 'balanced': ('good', 3), 'archival': ('good', 1)}
+SVTAV1_PRESETS = {'fastest': 12, 'balanced': 8, 'archival': 4}
+LIBAOM_CPU_USED = {'fastest': 8, 'balanced': 6, 'archival': 3}
+
+# в архивном профиле webm и mkv кодируются в AV1, если FFmpeg собран с таким кодировщиком
+AV1_ENCODERS = ['libsvtav1', 'libaom-av1']
+AV1_CONTAINERS = {'webm', 'mkv'}
+
+# Качество от 8 и выше означает «сохранить оригинал»: совместимые потоки копируются
+COPY_QUALITY_THRESHOLD = 8
+
+TWO_PASS_ENCODERS = {'libx264', 'libvpx-vp9'}
+# оба прохода должны видеть одинаковые кадры: по умолчанию null-мюксер пропускает метки как есть,
+# а mp4 выравнивает их под постоянную частоту, и x264 во втором проходе падает на расхождении
+TWO_PASS_SYNC_ARGS = ['-vsync', 'cfr']
+# доля битрейта, которая уходит на служебные данные контейнера
+MUXING_OVERHEAD = 0.02
+MIN_VIDEO_BITRATE = 100_000
+
+MODE_LABELS = {
+    'copy': "Копирование потоков",
+    'partial': "Частичное копирование",
+    'transcode': "Перекодирование",
+    'two_pass': "Двухпроходное кодирование",
+}
+
+
+def is_compatible(container, codec, table):
+    if codec is None or container not in table:
+        return False
+    allowed = table[container]
+    return allowed is None or codec in allowed
+
+
+def video_codec_args(encoder, quality):
+    quality = min(10, max(1, quality))
+    if encoder == 'libx264':
+        return ['-c:v', 'libx264', '-crf', str(23 - quality * 2)]
+    if encoder == 'libvpx-vp9':
+        # без -b:v 0 libvpx работает в режиме ограниченного битрейта, а не постоянного качества
+        return ['-c:v', 'libvpx-vp9', '-crf', str(31 - quality * 3), '-b:v', '0']
+    if encoder == 'libsvtav1':
+        return ['-c:v', 'libsvtav1', '-crf', str(45 - quality * 2)]
+    if encoder == 'libaom-av1':
+        return ['-c:v', 'libaom-av1', '-crf', str(45 - quality * 2), '-b:v', '0']
+    return ['-c:v', encoder, '-q:v', str(2 + (10 - quality) * 3)]
+
+
+def _tile_columns(width):
+    # libvpx делит кадр на 2^N колонок шириной не меньше 256 пикселей
+    if not width:
+        return 2
+    return max(0, min(6, (width // 256).bit_length() - 1))
+
+
+def speed_args(encoder, speed_profile=DEFAULT_SPEED_PROFILE, width=None):
+    if speed_profile not in SPEED_PROFILES:
+        speed_profile = DEFAULT_SPEED_PROFILE
+    if encoder == 'libx264':
+        return ['-preset', X264_PRESETS[speed_profile]]
+    if encoder == 'libvpx-vp9':
+        deadline, cpu_used = VP9_SPEED[speed_profile]
+        return ['-deadline', deadline, '-cpu-used', str(cpu_used), '-row-mt', '1',
+                '-tile-columns', str(_tile_columns(width))]
+    if encoder == 'libsvtav1':
+        return ['-preset', str(SVTAV1_PRESETS[speed_profile])]
+    if encoder == 'libaom-av1':
+        return ['-cpu-used', str(LIBAOM_CPU_USED[speed_profile]), '-row-mt', '1',
+                '-tiles', '2x2']
+    return []
+
+
+def video_encoder(output_format, speed_profile=DEFAULT_SPEED_PROFILE, encoders=None):
+    if speed_profile == 'archival' and output_format in AV1_CONTAINERS and encoders:
+        for encoder in AV1_ENCODERS:
+            if encoder in encoders:
+                return encoder
+    return VIDEO_ENCODERS.get(output_format)
+
+
+def audio_codec_args(encoder, quality):
+    quality = min(10, max(1, quality))
+    if encoder == 'libmp3lame':
+        return ['-c:a', 'libmp3lame', '-q:a', str(9 - min(9, max(0, quality - 1)))]
+    if encoder == 'flac':
+        return ['-c:a', 'flac', '-compression_level', str(min(12, max(0, quality)))]
+    if encoder == 'libvorbis':
+        return ['-c:a', 'libvorbis', '-q:a', str(quality)]
+    if encoder.startswith('pcm_'):
+        return ['-c:a', encoder]
+    return ['-c:a', encoder, '-b:a', f'{64 + quality * 16}k']
+
+
+def _first_stream(probe_info, codec_type):
+    for stream in probe_info.get('streams', []):
+        if stream.get('codec_type') == codec_type:
+            return stream
+    return None
+
+
+def _mode(copied, transcoded):
+    if copied and not transcoded:
+        return 'copy'
+    if copied:
+        return 'partial'
+    return 'transcode'
+
+
+def _legacy_video_plan(output_format, quality, speed_profile, encoders):
+    if quality < 10 and output_format in ['mp4', 'webm', 'mkv']:
+        encoder = video_encoder(output_format, speed_profile, encoders)
+        return {'mode': 'transcode', 'video': encoder, 'audio': None,
+                'args': video_codec_args(encoder, quality) + speed_args(encoder, speed_profile),
+                'speed_profile': speed_profile}
+    return {'mode': 'copy', 'args': ['-c', 'copy'], 'video': 'copy', 'audio': 'copy'}
+
+
+def plan_video(probe_info, output_format, quality, speed_profile=DEFAULT_SPEED_PROFILE,
+               encoders=None):
+    if not probe_info or output_format not in VIDEO_CONTAINER_CODECS:
+        return _legacy_video_plan(output_format, quality, speed_profile, encoders)
+
+    video_stream = _first_stream(probe_info, 'video')
+    audio_stream = _first_stream(probe_info, 'audio')
+    allow_copy = quality >= COPY_QUALITY_THRESHOLD
+    copied, transcoded = [], []
+
+    video, video_args = None, []
+    if video_stream is not None:
+        if allow_copy and is_compatible(output_format, video_stream['codec_name'], VIDEO_CONTAINER_CODECS):
+            video = 'copy'
+            video_args = ['-c:v', 'copy']
+            copied.append('video')
+        else:
+            video = video_encoder(output_format, speed_profile, encoders)
+            video_args = video_codec_args(video, quality) + \
+                speed_args(video, speed_profile, video_stream.get('width'))
+            transcoded.append('video')
+
+    audio, audio_args = None, []
+    if audio_stream is not None:
+        if allow_copy and is_compatible(output_format, audio_stream['codec_name'], AUDIO_CONTAINER_CODECS):
+            audio = 'copy'
+            audio_args = ['-c:a', 'copy']
+            copied.append('audio')
+        else:
+            audio = AUDIO_ENCODERS[output_format]
+            audio_args = audio_codec_args(audio, quality)
+            transcoded.append('audio')
+
+    args = ['-map', '0:V:0?', '-map', '0:a:0?'] + video_args + audio_args
+    return {'mode': _mode(copied, transcoded), 'args': args, 'video': video, 'audio': audio,
+            'video_args': video_args, 'audio_args': audio_args,
+            'speed_profile': speed_profile if 'video' in transcoded else None}
+
+
+def _legacy_audio_plan(output_format, quality):
+    if output_format == 'mp3':
+        return {'mode': 'transcode', 'args': audio_codec_args('libmp3lame', quality),
+                'video': None, 'audio': 'libmp3lame'}
+    if output_format == 'flac':
+        return {'mode': 'transcode', 'args': audio_codec_args('flac', quality),
+                'video': None, 'audio': 'flac'}
+    encoder = AUDIO_ENCODERS.get(output_format, 'aac')
+    return {'mode': 'transcode', 'args': audio_codec_args(encoder, quality),
+            'video': None, 'audio': encoder}
+
+
+def plan_audio(probe_info, output_format, quality, stream=None):
+    if stream is None and probe_info:
+        stream = _first_stream(probe_info, 'audio')
+    if stream is None:
+        return _legacy_audio_plan(output_format, quality)
+
+    args = ['-map', f"0:{stream['index']}"]
+    if quality >= COPY_QUALITY_THRESHOLD and is_compatible(output_format, stream['codec_name'], AUDIO_CONTAINER_CODECS):
+        return {'mode': 'copy', 'args': args + ['-c:a', 'copy'], 'video': None, 'audio': 'copy'}
+
+    encoder = AUDIO_ENCODERS.get(output_format, 'aac')
+    return {'mode': 'transcode', 'args': args + audio_codec_args(encoder, quality),
+            'video': None, 'audio': encoder}
+
+
+def target_bitrates(duration, has_audio, target_size=None, target_bitrate=None):
+    if target_bitrate is not None:
+        total = int(target_bitrate)
+    else:
+        if not duration:
+            return None
+        total = int(target_size * 8 / duration * (1 - MUXING_OVERHEAD))
+
+    audio = 0
+    if has_audio:
+        audio = min(128_000, max(32_000, total // 10))
+    video = total - audio
+    if video < MIN_VIDEO_BITRATE:
+        return None
+    return video, audio
+
+
+def plan_target(probe_info, output_format, video_bitrate, audio_bitrate,
+                speed_profile=DEFAULT_SPEED_PROFILE):
+    encoder = VIDEO_ENCODERS.get(output_format)
+    if encoder not in TWO_PASS_ENCODERS:
+        encoder = 'libx264' if is_compatible(output_format, 'h264', VIDEO_CONTAINER_CODECS) \
+            else None
+    if encoder is None:
+        return None
+
+    video_args = TWO_PASS_SYNC_ARGS + ['-c:v', encoder, '-b:v', f'{video_bitrate // 1000}k'] + \
+        speed_args(encoder, speed_profile, (probe_info or {}).get('width'))
+
+    audio, audio_args = None, []
+    if audio_bitrate:
+        audio = AUDIO_ENCODERS.get(output_format, 'aac')
+        audio_args = ['-c:a', audio, '-b:a', f'{audio_bitrate // 1000}k']
+
+    args = ['-map', '0:V:0?', '-map', '0:a:0?'] + video_args + audio_args
+    # первый проход — то же видео с теми же опциями, только без звука
+    first_pass_args = ['-map', '0:V:0?'] + video_args + ['-an']
+    return {'mode': 'two_pass', 'args': args, 'first_pass_args': first_pass_args,
+            'video': encoder, 'audio': audio, 'video_args': video_args, 'audio_args': audio_args,
+            'speed_profile': speed_profile}
+
+
+def plan_details(plan):
+    details = {'conversion_mode': plan['mode']}
+    if plan.get('speed_profile'):
+        details['speed_profile'] = plan['speed_profile']
+    return details
+
+
+def describe_plan(plan):
+    parts = [MODE_LABELS.get(plan['mode'], plan['mode'])]
+    streams = []
+    if plan.get('video'):
+        streams.append(f"видео: {plan['video']}")
+    if plan.get('audio'):
+        streams.append(f"аудио: {plan['audio']}")
+    if streams:
+        parts.append(f"({', '.join(streams)})")
+    if plan.get('speed_profile'):
+        parts.append(f"[{SPEED_PROFILE_LABELS.get(plan['speed_profile'], plan['speed_profile'])}]")
+    return ' '.join(parts)
@@ -1,5 +1,5 @@
 from PyQt6.QtWidgets import QPushButton, QWidget, QHBoxLayout, QLabel
-from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, pyqtProperty
+from PyQt6.QtCore import QPropertyAnimation, QEasingCurve, pyqtProperty
 
 
 class AnimatedButton(QPushButton):
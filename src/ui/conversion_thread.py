@@ -0,0 +1,94 @@
+import logging
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from converter import ConversionResult
+
+
+class ConversionThread(QThread):
+    finished = pyqtSignal(bool, str)
+    progress = pyqtSignal(int)
+    progress_info = pyqtSignal(dict)
+
+    def __init__(self, converter, input_file, output_format, output_path, operation_type, quality,
+                 extra_outputs=None, all_tracks=False, target_size=None):
+        super().__init__()
+        self.converter = converter
+        self.input_file = input_file
+        self.output_format = output_format
+        self.output_path = output_path
+        self.operation_type = operation_type
+        self.quality = quality
+        self.extra_outputs = extra_outputs or []
+        self.all_tracks = all_tracks
+        self.target_size = target_size
+        self.result = None
+        self.results = []
+        self.control = converter.new_control()
+        self.logger = logging.getLogger(__name__)
+
+    def run(self):
+        try:
+            self.logger.info(f"Начало операции: {self.operation_type}")
+            self.logger.info(f"Входной файл: {self.input_file}")
+            self.logger.info(f"Выходной формат: {self.output_format}")
+            self.logger.info(f"Путь сохранения: {self.output_path}")
+            self.logger.info(f"Качество: {self.quality}")
+
+            if self.extra_outputs or self.all_tracks:
+                if self.all_tracks:
+                    self.results = self.converter.extract_audio_tracks(
+                        self.input_file, self.output_format, self.output_path, self.quality,
+                        self.on_progress, control=self.control
+                    )
+                else:
+                    outputs = [(self.operation_type, self.output_format)] + self.extra_outputs
+                    self.results = self.converter.convert_multi(
+                        self.input_file, outputs, self.output_path, self.quality,
+                        self.on_progress, self.control
+                    )
+                result = ConversionResult(
+                    all(item.success for _, item in self.results),
+                    '\n'.join(item.message for _, item in self.results),
+                    **self.results[0][1].details
+                )
+            elif self.operation_type == 'video' and self.target_size:
+                result = self.converter.convert_video_target(
+                    self.input_file, self.output_format, self.output_path, self.target_size,
+                    progress_callback=self.on_progress, control=self.control
+                )
+            elif self.operation_type == 'video':
+                result = self.converter.convert_video(
+                    self.input_file, self.output_format, self.output_path, self.quality,
+                    self.on_progress, self.control
+                )
+            else:
+                result = self.converter.extract_audio(
+                    self.input_file, self.output_format, self.output_path, self.quality,
+                    self.on_progress, self.control
+                )
+
+            self.result = result
+            success, message = result
+
+            if success:
+                self.logger.info(f"Операция завершена успешно: {message}")
+            elif self.control.aborted:
+                self.logger.warning(f"Операция прервана: {message}")
+            else:
+                self.logger.error(f"Ошибка операции: {message}")
+
+            self.finished.emit(success, message)
+
+        except Exception as e:
+            error_msg = f"Неожиданная ошибка в потоке конвертации: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            self.result = ConversionResult(False, error_msg)
+            self.finished.emit(False, error_msg)
+
+    def cancel(self):
+        self.control.cancel()
+
+    def on_progress(self, info):
+        if info['percent'] is not None:
+            self.progress.emit(int(info['percent']))
+        self.progress_info.emit(info)
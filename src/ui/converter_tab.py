@@ -2,13 +2,16 @@ import os
 import sys
 import subprocess
 import logging
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout,
                              QRadioButton, QLabel, QFileDialog, QMessageBox,
-                             QGroupBox, QComboBox, QProgressBar)
+                             QGroupBox, QComboBox, QProgressBar,
+                             QListWidget, QListWidgetItem, QCheckBox,
+                             QDoubleSpinBox)
 from PyQt6.QtCore import Qt
 
-from mcv import ConversionThread
-from utils import get_file_size
+from ui.conversion_thread import ConversionThread
+from ffmpeg_runner import format_eta
+from probe import describe
 from ui.components import AnimatedButton
 
 
@@ -145,7 +148,8 @@ class ConverterTab(QWidget):
         format_group = QGroupBox("Выходной формат")
         format_group.setStyleSheet(operation_group.styleSheet())
 
-        format_layout = QHBoxLayout()
+        format_layout = QVBoxLayout()
+        primary_layout = QHBoxLayout()
 
         self.format_combo = QComboBox()
         self.format_combo.setStyleSheet("""
@@ -180,10 +184,57 @@ class ConverterTab(QWidget):
             }
         """)
 
+        extra_label = QLabel("Дополнительно сохранить в (одно декодирование):")
+        extra_label.setStyleSheet("color: #2c3e50; font-size: 12px; font-weight: normal;")
+
+        self.extra_formats_list = QListWidget()
+        self.extra_formats_list.setFlow(QListWidget.Flow.LeftToRight)
+        self.extra_formats_list.setWrapping(True)
+        self.extra_formats_list.setMaximumHeight(70)
+        self.extra_formats_list.setStyleSheet("""
+            QListWidget {
+                border: 1px solid #bdc3c7;
+                border-radius: 5px;
+                background: white;
+                color: #2c3e50;
+                font-size: 12px;
+                font-weight: normal;
+            }
+        """)
+
+        self.cb_all_tracks = QCheckBox("Все аудиодорожки (отдельный файл на дорожку)")
+        self.cb_all_tracks.setStyleSheet("color: #2c3e50; font-size: 12px; font-weight: normal;")
+        self.cb_all_tracks.setVisible(False)
+
+        self.target_size = QDoubleSpinBox()
+        self.target_size.setRange(0, 100000)
+        self.target_size.setDecimals(1)
+        self.target_size.setSuffix(" МБ")
+        self.target_size.setSpecialValueText("Размер: по качеству")
+        self.target_size.setToolTip(
+            "Целевой размер файла: двухпроходное кодирование с расчетом битрейта")
+        self.target_size.setStyleSheet("""
+            QDoubleSpinBox {
+                border: 2px solid #bdc3c7;
+                border-radius: 5px;
+                padding: 6px;
+                background: white;
+                font-size: 13px;
+                color: #2c3e50;
+                min-width: 150px;
+            }
+        """)
+
         self.update_format_options()
+        self.format_combo.currentTextChanged.connect(self.update_extra_formats)
 
-        format_layout.addWidget(self.format_combo)
-        format_layout.addStretch()
+        primary_layout.addWidget(self.format_combo)
+        primary_layout.addWidget(self.cb_all_tracks)
+        primary_layout.addWidget(self.target_size)
+        primary_layout.addStretch()
+        format_layout.addLayout(primary_layout)
+        format_layout.addWidget(extra_label)
+        format_layout.addWidget(self.extra_formats_list)
 
         format_group.setLayout(format_layout)
 
@@ -229,6 +280,28 @@ class ConverterTab(QWidget):
         self.btn_convert.clicked.connect(self.convert_media)
         self.btn_convert.setEnabled(False)
 
+        self.btn_cancel = AnimatedButton("⏹ Отменить")
+        self.btn_cancel.setStyleSheet("""
+            AnimatedButton {
+                background: #e74c3c;
+                color: white;
+                border: none;
+                border-radius: 8px;
+                font-size: 14px;
+                font-weight: bold;
+                height: 35px;
+            }
+            AnimatedButton:hover {
+                background: #c0392b;
+            }
+            AnimatedButton:disabled {
+                background: #bdc3c7;
+                color: #7f8c8d;
+            }
+        """)
+        self.btn_cancel.clicked.connect(self.cancel_conversion)
+        self.btn_cancel.hide()
+
         layout.addWidget(title)
         layout.addWidget(ffmpeg_status)
         layout.addSpacing(10)
@@ -241,32 +314,24 @@ class ConverterTab(QWidget):
         layout.addSpacing(10)
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.btn_convert)
+        layout.addWidget(self.btn_cancel)
         layout.addStretch()
 
         self.setLayout(layout)
 
     def get_ffmpeg_status(self):
-        if self.parent.converter.ffmpeg_available:
-            try:
-                result = subprocess.run(
-                    ['ffmpeg', '-version'], capture_output=True, text=True, encoding='utf-8')
-                if result.returncode == 0:
-                    first_line = result.stdout.split('\n')[0]
-                    return f"FFmpeg: ✅ Доступен ({first_line})"
-            except:
-                pass
+        capabilities = self.parent.converter.capabilities
+        if capabilities.available:
+            if capabilities.version_line:
+                return f"FFmpeg: ✅ Доступен ({capabilities.version_line})"
             return "FFmpeg: ✅ Доступен"
         else:
             return "FFmpeg: ❌ Не найден (установите FFmpeg для работы)"
 
     def show_ffmpeg_details(self, event):
-        if self.parent.converter.ffmpeg_available:
-            try:
-                result = subprocess.run(
-                    ['ffmpeg', '-version'], capture_output=True, text=True, encoding='utf-8')
-                details = result.stdout[:500]
-            except:
-                details = "Не удалось получить информацию о версии"
+        capabilities = self.parent.converter.capabilities
+        if capabilities.available:
+            details = capabilities.summary()
         else:
             details = "FFmpeg не установлен или не найден в PATH\n\nУстановите FFmpeg:\n• Windows: скачайте с ffmpeg.org\n• Linux: sudo apt install ffmpeg\n• macOS: brew install ffmpeg"
 
@@ -280,6 +345,8 @@ class ConverterTab(QWidget):
             self.operation_type = "audio"
             self.btn_convert.setText("🎵 Извлечь аудио")
 
+        self.cb_all_tracks.setVisible(self.operation_type == "audio")
+        self.target_size.setVisible(self.operation_type == "video")
         self.update_format_options()
         self.logger.info(f"Тип операции изменен на: {self.operation_type}")
 
@@ -295,6 +362,36 @@ class ConverterTab(QWidget):
             self.format_combo.setCurrentText("mp4")
         else:
             self.format_combo.setCurrentText("mp3")
+        self.update_extra_formats()
+
+    def update_extra_formats(self):
+        converter = self.parent.converter
+        checked = set(self.selected_extra_outputs())
+        primary = self.format_combo.currentText()
+
+        self.extra_formats_list.clear()
+        formats = [('audio', fmt) for fmt in converter.supported_audio_formats]
+        if self.operation_type == "video":
+            formats = [('video', fmt) for fmt in converter.supported_video_formats] + formats
+
+        for operation_type, output_format in formats:
+            if output_format == primary:
+                continue
+            label = output_format if operation_type == 'video' else f"{output_format} (аудио)"
+            item = QListWidgetItem(label)
+            item.setData(Qt.ItemDataRole.UserRole, (operation_type, output_format))
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked if (operation_type, output_format) in checked
+                               else Qt.CheckState.Unchecked)
+            self.extra_formats_list.addItem(item)
+
+    def selected_extra_outputs(self):
+        outputs = []
+        for row in range(self.extra_formats_list.count()):
+            item = self.extra_formats_list.item(row)
+            if item.checkState() == Qt.CheckState.Checked:
+                outputs.append(item.data(Qt.ItemDataRole.UserRole))
+        return outputs
 
     def select_file(self):
         file_filter = "Video Files (*.mp4 *.avi *.mkv *.mov *.webm *.flv *.wmv);;All Files (*)" if self.operation_type == "video" else "All Files (*)"
@@ -309,7 +406,11 @@ class ConverterTab(QWidget):
         if file_path:
             self.selected_file = file_path
             filename = os.path.basename(file_path)
-            self.file_label.setText(f"📄 {filename}")
+            media_info = describe(self.parent.converter.probe.probe(file_path))
+            if media_info:
+                self.file_label.setText(f"📄 {filename}\n{media_info}")
+            else:
+                self.file_label.setText(f"📄 {filename}")
             self.btn_convert.setEnabled(True)
             self.logger.info(f"Выбран файл: {file_path}")
 
@@ -341,61 +442,87 @@ class ConverterTab(QWidget):
                 f"Используется папка исходного файла: {output_dir}")
 
         output_format = self.format_combo.currentText()
+        extra_outputs = self.selected_extra_outputs()
+        all_tracks = self.operation_type == "audio" and self.cb_all_tracks.isChecked()
+        target_size = None
+        if self.operation_type == "video" and self.target_size.value() > 0:
+            target_size = int(self.target_size.value() * 1024 * 1024)
         quality = settings.get_int("quality", 8)
 
+        formats = ', '.join([output_format] + [fmt for _, fmt in extra_outputs])
         self.logger.info(
-            f"Начало конвертации: {self.selected_file} -> {output_format}, качество: {quality}")
+            f"Начало конвертации: {self.selected_file} -> {formats}, качество: {quality}")
 
         self.progress_bar.show()
         self.progress_bar.setRange(0, 0)
+        self.progress_bar.setFormat("%p%")
         self.btn_convert.setEnabled(False)
 
+        self.current_job = {
+            'input_file': self.selected_file,
+            'output_format': output_format,
+            'output_path': output_dir,
+            'operation_type': self.operation_type,
+            'quality': quality,
+        }
+
         self.conversion_thread = ConversionThread(
             self.parent.converter,
             self.selected_file,
             output_format,
             output_dir,
             self.operation_type,
-            quality
+            quality,
+            extra_outputs,
+            all_tracks,
+            target_size
         )
         self.conversion_thread.finished.connect(self.on_conversion_finished)
+        self.conversion_thread.progress_info.connect(self.on_conversion_progress)
         self.conversion_thread.start()
+        self.btn_cancel.setEnabled(True)
+        self.btn_cancel.show()
+
+    def cancel_conversion(self):
+        self.btn_cancel.setEnabled(False)
+        self.progress_bar.setFormat("Отмена…")
+        self.conversion_thread.cancel()
+        self.logger.info("Запрошена отмена конвертации")
+
+    def on_conversion_progress(self, info):
+        if info['percent'] is None:
+            return
+
+        if self.progress_bar.maximum() == 0:
+            self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(int(info['percent']))
+
+        text = f"%p% • осталось {format_eta(info['eta'])}"
+        if info['speed']:
+            text += f" • {info['speed']:.2f}x"
+        self.progress_bar.setFormat(text)
 
     def on_conversion_finished(self, success, message):
         self.progress_bar.hide()
+        self.btn_cancel.hide()
         self.btn_convert.setEnabled(True)
 
-        output_format = self.format_combo.currentText()
-        base_name = os.path.splitext(os.path.basename(self.selected_file))[0]
+        job = self.current_job
+        output_dir = job['output_path']
 
         settings = self.parent.settings_db
-        use_constant_output = settings.get_bool("use_constant_output", False)
-        constant_output_folder = settings.get_value("output_folder", "")
-
-        if use_constant_output and constant_output_folder:
-            output_dir = constant_output_folder
+        if self.conversion_thread.results:
+            for output, result in self.conversion_thread.results:
+                self.parent.converter.record_result(
+                    settings, dict(job, **output), *result, details=result.details)
         else:
-            output_dir = os.path.dirname(self.selected_file)
-
-        output_file = os.path.join(output_dir, f"{base_name}.{output_format}")
+            result = self.conversion_thread.result
+            self.parent.converter.record_result(
+                settings, job, success, message,
+                details=result.details if result is not None else None)
 
         if success:
             if settings.get_bool("save_history", False):
-                file_size_before = get_file_size(self.selected_file)
-                file_size_after = get_file_size(
-                    output_file) if os.path.exists(output_file) else None
-
-                self.parent.settings_db.add_conversion_record(
-                    input_file=self.selected_file,
-                    output_file=output_file,
-                    operation_type=self.operation_type,
-                    format=output_format,
-                    quality=settings.get_int("quality", 8),
-                    status='success',
-                    message=message,
-                    file_size_before=file_size_before,
-                    file_size_after=file_size_after
-                )
                 self.logger.info("Запись добавлена в историю конвертаций")
 
             if settings.get_bool("delete_original", False) and self.selected_file:
@@ -422,25 +549,16 @@ class ConverterTab(QWidget):
                     self.logger.info(f"Открыта папка: {output_dir}")
                 except Exception as e:
                     self.logger.error(f"Не удалось открыть папку: {e}")
+        elif self.conversion_thread.control.status == 'cancelled':
+            QMessageBox.information(self, "⏹ Отменено", message)
         else:
             if settings.get_bool("save_history", False):
-                file_size_before = get_file_size(self.selected_file)
-
-                self.parent.settings_db.add_conversion_record(
-                    input_file=self.selected_file,
-                    output_file=None,
-                    operation_type=self.operation_type,
-                    format=output_format,
-                    quality=settings.get_int("quality", 8),
-                    status='error',
-                    message=message,
-                    file_size_before=file_size_before,
-                    file_size_after=None
-                )
                 self.logger.info(
                     "Запись об ошибке добавлена в историю конвертаций")
 
-            self.show_detailed_message("❌ Ошибка", message, success=False)
+            title = "⏱ Таймаут" if self.conversion_thread.control.status == 'timeout' \
+                else "❌ Ошибка"
+            self.show_detailed_message(title, message, success=False)
 
     def show_detailed_message(self, title, message, success=True):
         msg_box = QMessageBox(self)
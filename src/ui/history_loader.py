@@ -0,0 +1,68 @@
+import logging
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class LoadTask(QRunnable):
+    def __init__(self, loader, kind, generation, func, args):
+        super().__init__()
+        self.loader = loader
+        self.kind = kind
+        self.generation = generation
+        self.func = func
+        self.args = args
+
+    def run(self):
+        # запрос, вытесненный более новым до старта, не выполняем вовсе
+        if not self.loader.is_current(self.kind, self.generation):
+            return
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            self.loader.logger.error(f"Ошибка загрузки ({self.kind}): {e}", exc_info=True)
+            self.loader._failed.emit(self.kind, self.generation, str(e))
+            return
+        self.loader._finished.emit(self.kind, self.generation, result)
+
+
+class HistoryLoader(QObject):
+    loaded = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    # сигналы из потоков пула, доставляются в поток GUI очередью
+    _finished = pyqtSignal(str, int, object)
+    _failed = pyqtSignal(str, int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.generations = {}
+        self._finished.connect(self._on_finished)
+        self._failed.connect(self._on_failed)
+
+    def request(self, kind, func, *args):
+        # новый запрос того же вида делает все предыдущие устаревшими
+        generation = self.generations.get(kind, 0) + 1
+        self.generations[kind] = generation
+        self.pool.start(LoadTask(self, kind, generation, func, args))
+
+    def cancel(self, kind):
+        self.generations[kind] = self.generations.get(kind, 0) + 1
+
+    def is_current(self, kind, generation):
+        return self.generations.get(kind) == generation
+
+    def shutdown(self):
+        for kind in list(self.generations):
+            self.cancel(kind)
+        self.pool.clear()
+        self.pool.waitForDone()
+
+    def _on_finished(self, kind, generation, result):
+        if self.is_current(kind, generation):
+            self.loaded.emit(kind, result)
+
+    def _on_failed(self, kind, generation, message):
+        if self.is_current(kind, generation):
+            self.failed.emit(kind, message)
@@ -0,0 +1,134 @@
+import os
+from datetime import datetime
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+
+STATUS_LABELS = {
+    'success': "✅ Успех",
+    'error': "❌ Ошибка",
+    'cancelled': "⏹ Отменено",
+    'timeout': "⏱ Таймаут",
+}
+
+HEADERS = ["Дата и время", "Операция", "Исходный файл", "Формат",
+           "Качество", "Статус", "Размер файла"]
+
+
+def format_size(size_bytes):
+    if size_bytes is None:
+        return "N/A"
+
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
+
+class HistoryTableModel(QAbstractTableModel):
+    PAGE_SIZE = 200
+
+    page_loaded = pyqtSignal()
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, settings_db, loader, parent=None):
+        super().__init__(parent)
+        self.settings_db = settings_db
+        self.loader = loader
+        # строки хранятся кортежами из get_history_page, полная запись читается по id
+        self.rows = []
+        self.exhausted = False
+        self.loading = False
+        self.loader.loaded.connect(self._on_loaded)
+        self.loader.failed.connect(self._on_failed)
+
+    def reload(self):
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = False
+        self.loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted or self.loading:
+            return
+        # страница читается в пуле потоков, строки добавятся по сигналу загрузчика
+        self.loading = True
+        before = (self.rows[-1][1], self.rows[-1][0]) if self.rows else None
+        self.loader.request('history', self.settings_db.get_history_page,
+                            before, self.PAGE_SIZE)
+
+    def _on_loaded(self, kind, page):
+        if kind == 'history':
+            self.loading = False
+            self.append_page(page)
+            self.page_loaded.emit()
+
+    def _on_failed(self, kind, message):
+        if kind == 'history':
+            # не повторяем запрос при прокрутке, повтор — по кнопке «Обновить»
+            self.loading = False
+            self.exhausted = True
+            self.load_failed.emit(message)
+
+    def append_page(self, page):
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+
+    def record_id(self, row):
+        return self.rows[row][0]
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        (record_id, timestamp, operation_type, input_file, fmt, quality, status,
+         size_before, size_after) = self.rows[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.ToolTipRole and column == 2:
+            return input_file
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        if column == 0:
+            return datetime.fromisoformat(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        if column == 1:
+            return "🎥 Видео" if operation_type == 'video' else "🎵 Аудио"
+        if column == 2:
+            return os.path.basename(input_file)
+        if column == 3:
+            return fmt.upper()
+        if column == 4:
+            return str(quality)
+        if column == 5:
+            return STATUS_LABELS.get(status, STATUS_LABELS['error'])
+
+        if size_before and size_after:
+            size_text = f"{format_size(size_before)} → {format_size(size_after)}"
+            compression = ((size_before - size_after) / size_before) * 100
+            if compression > 0:
+                size_text += f" (-{compression:.1f}%)"
+            return size_text
+        if size_before:
+            return format_size(size_before)
+        return "N/A"
@@ -1,18 +1,40 @@
 import os
 from datetime import datetime
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-                             QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QLabel, QTableView, QHeaderView, QStackedWidget,
                              QMessageBox, QGroupBox, QTextEdit, QSplitter)
 from PyQt6.QtCore import Qt
 
+from probe import describe
+from stream_plan import MODE_LABELS, SPEED_PROFILE_LABELS
+from ui.history_model import HistoryTableModel, STATUS_LABELS, format_size
+from ui.history_loader import HistoryLoader
+
+
+CACHE_LABELS = {
+    'hit': "взято из кэша",
+    'miss': "сохранено в кэш",
+}
+
+REPORT_STATUS_LABELS = {
+    'success': "УСПЕХ",
+    'error': "ОШИБКА",
+    'cancelled': "ОТМЕНА",
+    'timeout': "ТАЙМАУТ",
+}
+
 
 class HistoryTab(QWidget):
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
         self.settings = self.parent.settings_db
+        # запросы к базе идут в пуле потоков, чтобы запуск и обновление не ждали SQLite
+        self.loader = HistoryLoader(self)
+        self.loader.loaded.connect(self.on_loaded)
+        self.loader.failed.connect(self.on_failed)
         self.initUI()
-        self.load_history()
+        self.refresh()
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -41,7 +63,7 @@ class HistoryTab(QWidget):
                 border: 1px solid #bdc3c7;
             }
         """)
-        self.update_statistics()
+        self.stats_label.setText("Загрузка статистики…")
 
         controls_layout = QHBoxLayout()
 
@@ -64,7 +86,7 @@ class HistoryTab(QWidget):
                 }
             """)
 
-        self.btn_refresh.clicked.connect(self.load_history)
+        self.btn_refresh.clicked.connect(self.refresh)
         self.btn_clear.clicked.connect(self.clear_history)
         self.btn_export.clicked.connect(self.export_statistics)
 
@@ -73,25 +95,24 @@ class HistoryTab(QWidget):
         controls_layout.addWidget(self.btn_export)
         controls_layout.addStretch()
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels([
-            "Дата и время", "Операция", "Исходный файл", "Формат",
-            "Качество", "Статус", "Размер файла"
-        ])
+        self.model = HistoryTableModel(self.settings, self.loader, self)
+        self.model.page_loaded.connect(self.on_history_loaded)
+        self.model.load_failed.connect(self.on_history_failed)
+        self.table = QTableView()
+        self.table.setModel(self.model)
 
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 border: 2px solid #bdc3c7;
                 border-radius: 8px;
                 background: white;
                 gridline-color: #bdc3c7;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
                 border-bottom: 1px solid #ecf0f1;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background: #3498db;
                 color: white;
             }
@@ -108,10 +129,27 @@ class HistoryTab(QWidget):
             QHeaderView.ResizeMode.Interactive)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.setSelectionBehavior(
-            QTableWidget.SelectionBehavior.SelectRows)
+            QTableView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setVisible(False)
         self.table.setAlternatingRowColors(True)
         self.table.doubleClicked.connect(self.show_details)
 
+        self.placeholder = QLabel()
+        self.placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.placeholder.setStyleSheet("""
+            QLabel {
+                color: #7f8c8d;
+                font-size: 16px;
+                border: 2px solid #bdc3c7;
+                border-radius: 8px;
+                background: white;
+            }
+        """)
+
+        self.table_stack = QStackedWidget()
+        self.table_stack.addWidget(self.placeholder)
+        self.table_stack.addWidget(self.table)
+
         details_group = QGroupBox("Детали операции")
         details_group.setStyleSheet("""
             QGroupBox {
@@ -148,7 +186,7 @@ class HistoryTab(QWidget):
         details_group.setLayout(details_layout)
 
         splitter = QSplitter(Qt.Orientation.Vertical)
-        splitter.addWidget(self.table)
+        splitter.addWidget(self.table_stack)
         splitter.addWidget(details_group)
         splitter.setSizes([400, 200])
 
@@ -159,91 +197,99 @@ class HistoryTab(QWidget):
 
         self.setLayout(layout)
 
-    def load_history(self):
-        history = self.settings.get_conversion_history()
-        self.table.setRowCount(len(history))
-
-        for row, record in enumerate(history):
-            dt = datetime.fromisoformat(record['timestamp'])
-            date_item = QTableWidgetItem(dt.strftime("%Y-%m-%d %H:%M:%S"))
-
-            operation_text = "🎥 Видео" if record['operation_type'] == 'video' else "🎵 Аудио"
-            operation_item = QTableWidgetItem(operation_text)
-
-            input_file = os.path.basename(record['input_file'])
-            input_item = QTableWidgetItem(input_file)
-            input_item.setToolTip(record['input_file'])
-
-            format_item = QTableWidgetItem(record['format'].upper())
-
-            quality_item = QTableWidgetItem(str(record['quality']))
-
-            status_text = "✅ Успех" if record['status'] == 'success' else "❌ Ошибка"
-            status_item = QTableWidgetItem(status_text)
-
-            size_before = record['file_size_before']
-            size_after = record['file_size_after']
-            if size_before and size_after:
-                size_text = f"{self.format_size(size_before)} → {self.format_size(size_after)}"
-                compression = ((size_before - size_after) / size_before) * 100
-                if compression > 0:
-                    size_text += f" (-{compression:.1f}%)"
-            elif size_before:
-                size_text = self.format_size(size_before)
-            else:
-                size_text = "N/A"
-            size_item = QTableWidgetItem(size_text)
+    def refresh(self):
+        self.load_history()
+        self.update_statistics()
 
-            items = [date_item, operation_item, input_item, format_item,
-                     quality_item, status_item, size_item]
+    def load_history(self):
+        self.placeholder.setText("⏳ Загрузка истории…")
+        self.table_stack.setCurrentWidget(self.placeholder)
+        self.model.reload()
 
-            for col, item in enumerate(items):
-                item.setData(Qt.ItemDataRole.UserRole, record)
-                self.table.setItem(row, col, item)
+    def on_history_loaded(self):
+        if self.table_stack.currentWidget() is self.placeholder:
+            self.table_stack.setCurrentWidget(self.table)
+            # ширина колонок по первой странице, а не по всей истории
+            self.table.resizeColumnsToContents()
 
-        self.table.resizeColumnsToContents()
+    def on_history_failed(self, message):
+        if not self.model.rows:
+            self.placeholder.setText(f"❌ Не удалось загрузить историю: {message}")
 
     def format_size(self, size_bytes):
-        if size_bytes is None:
-            return "N/A"
-
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        return format_size(size_bytes)
 
     def update_statistics(self):
-        stats = self.settings.get_statistics()
+        self.loader.request('statistics', self.settings.get_statistics)
+
+    def on_loaded(self, kind, result):
+        if kind == 'statistics':
+            self.show_statistics(result)
+        elif kind == 'report':
+            self.show_report(result)
+        elif kind == 'clear':
+            self.btn_clear.setEnabled(True)
+            self.refresh()
+
+    def on_failed(self, kind, message):
+        if kind == 'statistics':
+            self.stats_label.setText(f"Не удалось загрузить статистику: {message}")
+        elif kind == 'report':
+            self.btn_export.setEnabled(True)
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сформировать отчет: {message}")
+        elif kind == 'clear':
+            self.btn_clear.setEnabled(True)
+            self.refresh()
+            QMessageBox.warning(self, "Ошибка", f"Не удалось очистить историю: {message}")
+
+    def show_statistics(self, stats):
         self.stats_label.setText(
             f"Всего операций: {stats['total']} | "
             f"Успешно: {stats['success']} | "
             f"Ошибок: {stats['error']} | "
-            f"Успешность: {stats['success_rate']:.1f}%"
+            f"Прервано: {stats['cancelled'] + stats['timeout']} | "
+            f"Успешность: {stats['success_rate']:.1f}% | "
+            f"Из кэша: {stats['cache_hits']} "
+            f"(сэкономлено {stats['cache_saved_seconds'] / 60:.1f} мин)"
         )
 
     def show_details(self, index):
-        item = self.table.item(index.row(), 0)
-        if item:
-            record = item.data(Qt.ItemDataRole.UserRole)
+        record = self.settings.get_conversion_record(self.model.record_id(index.row()))
+        if record:
+            media_info = describe(
+                self.parent.converter.probe.cached(record['input_file']))
             details = f"""
 Операция: {'Конвертация видео' if record['operation_type'] == 'video' else 'Извлечение аудио'}
 Дата и время: {datetime.fromisoformat(record['timestamp']).strftime("%Y-%m-%d %H:%M:%S")}
 Исходный файл: {record['input_file']}
+Параметры исходника: {media_info or 'N/A'}
 Выходной файл: {record['output_file'] or 'N/A'}
 Формат: {record['format'].upper()}
 Качество: {record['quality']}/10
-Статус: {'✅ Успешно' if record['status'] == 'success' else '❌ Ошибка'}
+Режим: {MODE_LABELS.get(record.get('conversion_mode'), 'N/A')}
+Профиль скорости: {SPEED_PROFILE_LABELS.get(record.get('speed_profile'), 'N/A')}
+Кэш: {CACHE_LABELS.get(record.get('cache_status'), 'не использовался')}
+Статус: {STATUS_LABELS.get(record['status'], STATUS_LABELS['error'])}
 
 Размеры файлов:
   • Исходный: {self.format_size(record['file_size_before']) if record['file_size_before'] else 'N/A'}
-  • Выходной: {self.format_size(record['file_size_after']) if record['file_size_after'] else 'N/A'}
+  • Выходной: {self.format_size(record['file_size_after']) if record['file_size_after'] else 'N/A'}{self.format_target(record)}
 
 Сообщение:
 {record['message']}
             """
             self.details_text.setPlainText(details.strip())
 
+    def format_target(self, record):
+        if record.get('target_size'):
+            line = f"\n  • Целевой: {self.format_size(record['target_size'])}"
+            if record['file_size_after']:
+                line += f" (достигнуто {record['file_size_after'] / record['target_size'] * 100:.1f}%)"
+            return line
+        if record.get('target_bitrate'):
+            return f"\n  • Целевой битрейт: {record['target_bitrate']} кбит/с"
+        return ""
+
     def clear_history(self):
         reply = QMessageBox.question(
             self,
@@ -253,12 +299,18 @@ class HistoryTab(QWidget):
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            self.settings.clear_history()
-            self.load_history()
-            self.update_statistics()
+            self.btn_clear.setEnabled(False)
+            self.placeholder.setText("⏳ Очистка истории…")
+            self.table_stack.setCurrentWidget(self.placeholder)
             self.details_text.clear()
+            self.loader.request('clear', self.settings.clear_history)
 
     def export_statistics(self):
+        self.btn_export.setEnabled(False)
+        self.loader.request('report', self.build_report)
+
+    def build_report(self):
+        # выполняется в пуле потоков: только запросы к базе и текст, без виджетов
         stats = self.settings.get_statistics()
         history = self.settings.get_conversion_history(1000)
 
@@ -271,7 +323,10 @@ class HistoryTab(QWidget):
 Всего операций: {stats['total']}
 Успешных: {stats['success']}
 Ошибок: {stats['error']}
+Отменено: {stats['cancelled']}, остановлено по таймауту: {stats['timeout']}
 Процент успеха: {stats['success_rate']:.1f}%
+Объем файлов: {self.format_size(stats['bytes_before'])} → {self.format_size(stats['bytes_after'])}
+Взято из кэша: {stats['cache_hits']} (сэкономлено {stats['cache_saved_seconds'] / 60:.1f} мин кодирования)
 
 Распределение по типам операций:
 """
@@ -287,11 +342,15 @@ class HistoryTab(QWidget):
 
         for record in history[:50]:
             dt = datetime.fromisoformat(record['timestamp'])
-            status = "УСПЕХ" if record['status'] == 'success' else "ОШИБКА"
+            status = REPORT_STATUS_LABELS.get(record['status'], "ОШИБКА")
             report += f"{dt.strftime('%Y-%m-%d %H:%M')} | {record['operation_type']:6} | {record['format']:4} | {status:6} | {os.path.basename(record['input_file'])}\n"
 
+        return report.strip()
+
+    def show_report(self, report):
+        self.btn_export.setEnabled(True)
         dialog = QMessageBox(self)
         dialog.setWindowTitle("Статистика конвертаций")
         dialog.setText("Отчет сгенерирован")
-        dialog.setDetailedText(report.strip())
+        dialog.setDetailedText(report)
         dialog.exec()
@@ -2,7 +2,7 @@ from ui.history_tab import HistoryTab
 from ui.settings_tab import SettingsTab
 from ui.converter_tab import ConverterTab
 from ui.components import TitleBar
-from mcv import MediaConverter
+from converter import MediaConverter
 from database import SettingsDB
 from PyQt6.QtGui import QPalette, QColor
 from PyQt6.QtCore import Qt
@@ -17,9 +17,16 @@ class MediaConverterGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.settings_db = SettingsDB()
-        self.converter = MediaConverter()
+        # история пишется в фоне, чтобы запись не подвешивала интерфейс
+        self.settings_db.start_history_recorder()
+        self.converter = MediaConverter(self.settings_db)
         self.initUI()
 
+    def closeEvent(self, event):
+        self.history_tab.loader.shutdown()
+        self.settings_db.stop_history_recorder()
+        super().closeEvent(event)
+
     def initUI(self):
         self.setWindowTitle("Media Converter")
         self.setGeometry(100, 100, 800, 700)
@@ -1,10 +1,12 @@
 import logging
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout,
                              QCheckBox, QLabel, QFileDialog, QMessageBox,
-                             QGroupBox, QComboBox, QLineEdit, QSlider)
+                             QGroupBox, QComboBox, QLineEdit, QSlider, QSpinBox)
 from PyQt6.QtCore import Qt
 
 from utils import setup_logging
+from result_cache import DEFAULT_CACHE_MAX_MB
+from stream_plan import SPEED_PROFILES, SPEED_PROFILE_LABELS, DEFAULT_SPEED_PROFILE
 from ui.components import AnimatedButton
 
 
@@ -162,6 +164,22 @@ class SettingsTab(QWidget):
         quality_desc.setWordWrap(True)
 
         quality_layout.addWidget(quality_desc)
+
+        speed_layout = QHBoxLayout()
+        speed_label = QLabel("Скорость кодирования:")
+        speed_label.setStyleSheet("color: #2c3e50; font-size: 14px;")
+        self.speed_combo = QComboBox()
+        for profile in SPEED_PROFILES:
+            self.speed_combo.addItem(SPEED_PROFILE_LABELS[profile], profile)
+        self.speed_combo.setToolTip(
+            "Быстрый — максимальная скорость, файл крупнее\n"
+            "Сбалансированный — разумный компромисс\n"
+            "Архивный — медленно, но минимальный размер (WebM/MKV в AV1, если доступен)")
+        speed_layout.addWidget(speed_label)
+        speed_layout.addWidget(self.speed_combo)
+        speed_layout.addStretch()
+
+        quality_layout.addLayout(speed_layout)
         quality_group.setLayout(quality_layout)
 
         theme_group = QGroupBox("Настройки темы")
@@ -202,6 +220,7 @@ class SettingsTab(QWidget):
             }
         """)
         self.theme_combo.currentTextChanged.connect(self.change_theme)
+        self.speed_combo.setStyleSheet(self.theme_combo.styleSheet())
 
         theme_layout.addWidget(self.theme_combo)
         theme_group.setLayout(theme_layout)
@@ -233,11 +252,57 @@ class SettingsTab(QWidget):
         self.cb_delete_original.setStyleSheet(
             self.cb_constant_output.styleSheet())
 
+        self.cb_use_cache = QCheckBox(
+            "Кэшировать результаты конвертации")
+        self.cb_use_cache.setStyleSheet(
+            self.cb_constant_output.styleSheet())
+
+        cache_limit_layout = QHBoxLayout()
+        cache_limit_label = QLabel("Лимит кэша (МБ):")
+        cache_limit_label.setStyleSheet("color: #2c3e50; font-size: 14px;")
+        self.cache_limit = QSpinBox()
+        self.cache_limit.setRange(100, 1024 * 1024)
+        self.cache_limit.setSingleStep(1024)
+        self.cache_limit.setValue(DEFAULT_CACHE_MAX_MB)
+        self.cache_limit.setStyleSheet(self.folder_path.styleSheet())
+        cache_limit_layout.addWidget(cache_limit_label)
+        cache_limit_layout.addWidget(self.cache_limit)
+        cache_limit_layout.addStretch()
+
+        stall_layout = QHBoxLayout()
+        stall_label = QLabel("Остановить FFmpeg без прогресса через (с):")
+        stall_label.setStyleSheet("color: #2c3e50; font-size: 14px;")
+        self.stall_timeout = QSpinBox()
+        self.stall_timeout.setRange(0, 24 * 3600)
+        self.stall_timeout.setSingleStep(30)
+        self.stall_timeout.setSpecialValueText("не ограничивать")
+        self.stall_timeout.setValue(120)
+        self.stall_timeout.setStyleSheet(self.folder_path.styleSheet())
+        stall_layout.addWidget(stall_label)
+        stall_layout.addWidget(self.stall_timeout)
+        stall_layout.addStretch()
+
+        runtime_layout = QHBoxLayout()
+        runtime_label = QLabel("Максимальное время конвертации (мин):")
+        runtime_label.setStyleSheet("color: #2c3e50; font-size: 14px;")
+        self.max_runtime = QSpinBox()
+        self.max_runtime.setRange(0, 7 * 24 * 60)
+        self.max_runtime.setSingleStep(30)
+        self.max_runtime.setSpecialValueText("не ограничивать")
+        self.max_runtime.setStyleSheet(self.folder_path.styleSheet())
+        runtime_layout.addWidget(runtime_label)
+        runtime_layout.addWidget(self.max_runtime)
+        runtime_layout.addStretch()
+
         advanced_layout.addWidget(self.cb_enable_logging)
         advanced_layout.addWidget(self.cb_auto_open)
         advanced_layout.addWidget(self.cb_show_details)
         advanced_layout.addWidget(self.cb_save_history)
         advanced_layout.addWidget(self.cb_delete_original)
+        advanced_layout.addWidget(self.cb_use_cache)
+        advanced_layout.addLayout(cache_limit_layout)
+        advanced_layout.addLayout(stall_layout)
+        advanced_layout.addLayout(runtime_layout)
         advanced_group.setLayout(advanced_layout)
 
         buttons_layout = QHBoxLayout()
@@ -315,6 +380,7 @@ class SettingsTab(QWidget):
                                 self.cb_constant_output.isChecked())
         self.settings.set_value("output_folder", self.folder_path.text())
         self.settings.set_value("quality", self.quality_slider.value())
+        self.settings.set_value("speed_profile", self.speed_combo.currentData())
         self.settings.set_value("theme", self.theme_combo.currentText())
         self.settings.set_value(
             "enable_logging", self.cb_enable_logging.isChecked())
@@ -325,6 +391,10 @@ class SettingsTab(QWidget):
             "save_history", self.cb_save_history.isChecked())
         self.settings.set_value(
             "delete_original", self.cb_delete_original.isChecked())
+        self.settings.set_value("use_cache", self.cb_use_cache.isChecked())
+        self.settings.set_value("cache_max_mb", self.cache_limit.value())
+        self.settings.set_value("stall_timeout", self.stall_timeout.value())
+        self.settings.set_value("max_runtime", self.max_runtime.value() * 60)
 
         setup_logging(self.cb_enable_logging.isChecked())
 
@@ -337,6 +407,9 @@ class SettingsTab(QWidget):
             self.settings.get_bool("use_constant_output", False))
         self.folder_path.setText(self.settings.get_value("output_folder", ""))
         self.quality_slider.setValue(self.settings.get_int("quality", 8))
+        speed_index = self.speed_combo.findData(
+            self.settings.get_value("speed_profile", DEFAULT_SPEED_PROFILE))
+        self.speed_combo.setCurrentIndex(max(0, speed_index))
         self.theme_combo.setCurrentText(
             self.settings.get_value("theme", "Светлая тема"))
         self.cb_enable_logging.setChecked(
@@ -349,6 +422,12 @@ class SettingsTab(QWidget):
             self.settings.get_bool("save_history", False))
         self.cb_delete_original.setChecked(
             self.settings.get_bool("delete_original", False))
+        self.cb_use_cache.setChecked(
+            self.settings.get_bool("use_cache", False))
+        self.cache_limit.setValue(
+            self.settings.get_int("cache_max_mb", DEFAULT_CACHE_MAX_MB))
+        self.stall_timeout.setValue(self.settings.get_int("stall_timeout", 120))
+        self.max_runtime.setValue(self.settings.get_int("max_runtime", 0) // 60)
 
         self.toggle_constant_output(self.cb_constant_output.isChecked())
         self.update_quality_label(self.quality_slider.value())
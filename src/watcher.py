@@ -0,0 +1,398 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import argparse
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from probe import MEDIA_EXTENSIONS
+from ffmpeg_runner import ControlRegistry
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+TEMPORARY_SUFFIXES = ('.part', '.tmp', '.crdownload', '.partial', '.download')
+
+
+def is_candidate(path):
+    name = os.path.basename(path)
+    if name.startswith('.') or name.lower().endswith(TEMPORARY_SUFFIXES):
+        return False
+    return os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS
+
+
+class PollingWatcher:
+    def __init__(self, folders, recursive=True, excluded=(), excluded_names=()):
+        self.folders = folders
+        self.recursive = recursive
+        self.excluded = {os.path.abspath(path) for path in excluded}
+        self.excluded_names = set(excluded_names)
+
+    def is_excluded(self, directory):
+        name = os.path.basename(directory)
+        return name.startswith('.') or name in self.excluded_names \
+            or os.path.abspath(directory) in self.excluded
+
+    def scan(self):
+        for folder in self.folders:
+            for root, dirs, files in os.walk(folder):
+                dirs[:] = [d for d in dirs if not self.is_excluded(
+                    os.path.join(root, d))]
+                for name in files:
+                    yield os.path.join(root, name)
+                if not self.recursive:
+                    break
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(PollingWatcher):
+    def __init__(self, folders, recursive=True, excluded=(), excluded_names=()):
+        super().__init__(folders, recursive, excluded, excluded_names)
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library(
+            'c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.ctypes = ctypes
+        self.watches = {}
+        try:
+            for folder in folders:
+                self._add_tree(folder)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(self.ctypes.get_errno(),
+                          f"inotify_add_watch failed: {directory}")
+        self.watches[wd] = directory
+
+    def _add_tree(self, folder):
+        self._add_watch(folder)
+        if not self.recursive:
+            return
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = [d for d in dirs if not self.is_excluded(
+                os.path.join(root, d))]
+            for name in dirs:
+                self._add_watch(os.path.join(root, name))
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                self.watches.pop(wd, None)
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if self.recursive and not self.is_excluded(path):
+                    try:
+                        self._add_tree(path)
+                    except OSError:
+                        # папка исчезла или кончились inotify-дескрипторы: полный обход
+                        return None
+                    changed.update(PollingWatcher(
+                        [path], True, self.excluded, self.excluded_names).scan())
+                continue
+            changed.add(path)
+
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(folders, recursive=True, excluded=(), excluded_names=(), use_inotify=True):
+    logger = logging.getLogger(__name__)
+    if use_inotify and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folders, recursive, excluded, excluded_names)
+        except OSError as e:
+            level = logging.WARNING if e.errno != errno.ENOSPC else logging.ERROR
+            logger.log(
+                level, f"inotify недоступен, используется опрос папок: {e}")
+    return PollingWatcher(folders, recursive, excluded, excluded_names)
+
+
+class WatchFolderDaemon:
+    def __init__(self, converter, settings_db, folders, operation_type='video', output_format=None,
+                 max_workers=None, poll_interval=2.0, stable_seconds=5.0, recursive=True,
+                 use_inotify=True, rescan_interval=60.0):
+        self.converter = converter
+        self.settings_db = settings_db
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.operation_type = operation_type
+        self.output_format = output_format or (
+            'mp4' if operation_type == 'video' else 'mp3')
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 1) // 2)
+        self.poll_interval = poll_interval
+        self.stable_seconds = stable_seconds
+        self.recursive = recursive
+        self.use_inotify = use_inotify
+        # inotify не видит записи с других машин на сетевых дисках и теряет события при
+        # переполнении очереди, поэтому полный обход все равно выполняется периодически
+        self.rescan_interval = rescan_interval
+        self.logger = logging.getLogger(__name__)
+
+        self.stop_event = threading.Event()
+        self.slots = threading.BoundedSemaphore(self.max_workers)
+        self.index_lock = threading.Lock()
+        self.pending = {}
+        self.in_progress = set()
+        self.processed = {}
+        self.controls = ControlRegistry()
+        # как во вкладке конвертера: постоянная папка действует, только если она включена
+        self.output_folder = ""
+        if settings_db.get_bool("use_constant_output", False):
+            self.output_folder = settings_db.get_value("output_folder", "")
+
+    def output_dir_for(self, input_file):
+        if self.output_folder:
+            return self.output_folder
+        return os.path.join(os.path.dirname(input_file), 'converted')
+
+    def _is_output(self, path):
+        directory = os.path.dirname(path)
+        if self.output_folder:
+            return os.path.abspath(directory) == os.path.abspath(self.output_folder)
+        return os.path.basename(directory) == 'converted'
+
+    def _is_new(self, path, stat):
+        with self.index_lock:
+            known = self.processed.get(path)
+            busy = path in self.in_progress
+        return not busy and known != (stat.st_size, stat.st_mtime_ns)
+
+    def _track(self, paths):
+        now = time.monotonic()
+        for path in paths:
+            path = os.path.abspath(path)
+            if not is_candidate(path) or self._is_output(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.pending.pop(path, None)
+                continue
+            if not self._is_new(path, stat):
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            previous = self.pending.get(path)
+            if previous is None or previous[0] != signature:
+                self.pending[path] = (signature, now)
+
+    def _ready_files(self):
+        now = time.monotonic()
+        ready = []
+        for path, (signature, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self.pending[path] = (current, now)
+            elif stat.st_size > 0 and now - since >= self.stable_seconds:
+                del self.pending[path]
+                ready.append((path, current))
+        return ready
+
+    def _dispatch(self, executor, path, signature):
+        while not self.slots.acquire(timeout=self.poll_interval):
+            if self.stop_event.is_set():
+                return False
+        with self.index_lock:
+            self.in_progress.add(path)
+        executor.submit(self._process, path, signature)
+        return True
+
+    def _process(self, path, signature):
+        job = {
+            'input_file': path,
+            'output_format': self.output_format,
+            'output_path': self.output_dir_for(path),
+            'operation_type': self.operation_type,
+            'quality': self.settings_db.get_int("quality", 8),
+        }
+        control = self.controls.register(self.converter.new_control())
+        try:
+            result = self.converter.convert(job['input_file'], job['output_format'], job['output_path'],
+                                            job['operation_type'], job['quality'], control=control)
+            success, message = result
+            self.converter.record_result(self.settings_db, job, success, message,
+                                         details=getattr(result, 'details', None))
+            if control.status == 'cancelled':
+                # остановка демона — не ошибка файла: после перезапуска он обработается заново
+                return
+
+            output_file = self.converter.get_output_file(
+                path, job['output_format'], job['output_path']) if success else None
+            status = 'success' if success else 'error'
+            self.settings_db.mark_watch_processed(
+                path, signature[0], signature[1], status, output_file)
+            with self.index_lock:
+                self.processed[path] = signature
+
+            if success and self.settings_db.get_bool("delete_original", False):
+                try:
+                    os.remove(path)
+                    self.logger.info(f"Исходный файл удален: {path}")
+                except OSError as e:
+                    self.logger.error(
+                        f"Не удалось удалить исходный файл: {e}")
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка обработки файла {path}: {e}", exc_info=True)
+        finally:
+            self.controls.unregister(control)
+            with self.index_lock:
+                self.in_progress.discard(path)
+            self.slots.release()
+
+    def stop(self):
+        self.stop_event.set()
+        self.controls.cancel_all()
+
+    def run(self):
+        self.processed = self.settings_db.get_watch_index()
+        watcher = create_watcher(self.folders, self.recursive,
+                                 excluded=[
+                                     self.output_folder] if self.output_folder else [],
+                                 excluded_names=[] if self.output_folder else [
+                                     'converted'],
+                                 use_inotify=self.use_inotify)
+        self.logger.info(
+            f"Наблюдение за папками: {', '.join(self.folders)} "
+            f"({type(watcher).__name__}, потоков: {self.max_workers}, "
+            f"в индексе: {len(self.processed)})")
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            self._track(watcher.scan())
+            last_scan = time.monotonic()
+            while not self.stop_event.is_set():
+                changed = watcher.wait(self.poll_interval)
+                if changed is None or time.monotonic() - last_scan >= self.rescan_interval:
+                    if changed is None:
+                        self.logger.debug("Полный обход папок после переполнения очереди событий")
+                    self._track(watcher.scan())
+                    last_scan = time.monotonic()
+                if changed:
+                    self._track(changed)
+
+                for path, signature in self._ready_files():
+                    if not self._dispatch(executor, path, signature):
+                        break
+        except BaseException:
+            # ffmpeg в своей сессии не получает Ctrl-C: без отмены shutdown ждал бы конца кодирования
+            self.stop()
+            raise
+        finally:
+            watcher.close()
+            executor.shutdown(wait=True)
+            self.logger.info("Наблюдение остановлено")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Наблюдение за папками и автоматическая конвертация новых файлов")
+    parser.add_argument('folders', nargs='+', help="Папки для наблюдения")
+    parser.add_argument('--audio', action='store_true',
+                        help="Извлекать аудио вместо конвертации видео")
+    parser.add_argument('--format', dest='output_format',
+                        help="Выходной формат")
+    parser.add_argument('--workers', type=int,
+                        help="Максимум одновременных конвертаций")
+    parser.add_argument('--stable-seconds', type=float, default=5.0,
+                        help="Сколько секунд размер файла должен не меняться")
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help="Интервал опроса в секундах")
+    parser.add_argument('--no-recursive', action='store_true',
+                        help="Не следить за вложенными папками")
+    parser.add_argument('--no-inotify', action='store_true',
+                        help="Всегда использовать опрос папок")
+    parser.add_argument('--rescan-interval', type=float, default=60.0,
+                        help="Интервал полного обхода папок в секундах при работе через inotify")
+    parser.add_argument('--db', default='settings.db',
+                        help="Путь к базе настроек")
+    args = parser.parse_args(argv)
+
+    from database import SettingsDB
+    from converter import MediaConverter
+    from utils import setup_logging
+
+    settings_db = SettingsDB(args.db)
+    setup_logging(settings_db.get_bool("enable_logging", True))
+    converter = MediaConverter(settings_db)
+    if not converter.ffmpeg_available:
+        return 1
+
+    daemon = WatchFolderDaemon(
+        converter, settings_db, args.folders,
+        operation_type='audio' if args.audio else 'video',
+        output_format=args.output_format,
+        max_workers=args.workers,
+        poll_interval=args.poll_interval,
+        stable_seconds=args.stable_seconds,
+        recursive=not args.no_recursive,
+        use_inotify=not args.no_inotify,
+        rescan_interval=args.rescan_interval)
+
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import stat
+import tempfile
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def add_src_path():
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+
+
+add_src_path()
+
+
+FAKE_FFMPEG = r'''
+import os
+import sys
+import json
+import time
+
+args = sys.argv[1:]
+if args == ['-version']:
+    print("ffmpeg version 6.1 fake")
+    sys.exit(0)
+if '-encoders' in args:
+    print("Encoders:\n V..... = Video\n ------")
+    for name in ('libx264', 'libvpx-vp9', 'mpeg4', 'aac', 'libopus', 'libmp3lame', 'flac'):
+        print(f" V....D {name:20} {name}")
+    sys.exit(0)
+if '-muxers' in args:
+    print("File formats:\n D. = Demuxing\n --")
+    for name in ('mp4', 'matroska', 'webm', 'mp3', 'avi', 'flac', 'null'):
+        print(f"  E {name:15} {name}")
+    sys.exit(0)
+if '-hwaccels' in args:
+    print("Hardware acceleration methods:")
+    sys.exit(0)
+
+state_dir = os.environ['FAKE_STATE_DIR']
+with open(os.path.join(state_dir, 'calls.jsonl'), 'a') as f:
+    f.write(json.dumps({'pid': os.getpid(), 'args': args}) + '\n')
+open(os.path.join(state_dir, f'ffmpeg.{os.getpid()}.pid'), 'w').close()
+
+def bitrate(name):
+    if name not in args:
+        return 0
+    value = args[args.index(name) + 1]
+    return int(value.rstrip('k')) * 1000 if value.endswith('k') else int(value)
+
+outputs = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '-y']
+sleep = float(os.environ.get('FAKE_FFMPEG_SLEEP') or 0)
+slow_arg = os.environ.get('FAKE_SLOW_ARG')
+if sleep and (not slow_arg or slow_arg in args):
+    print("out_time_us=500000\nprogress=continue", flush=True)
+    time.sleep(sleep)
+
+duration = float(os.environ.get('FAKE_DURATION') or 60)
+overhead = float(os.environ.get('FAKE_MUX_OVERHEAD') or 0)
+fail_pass = os.environ.get('FAKE_FAIL_PASS')
+current_pass = args[args.index('-pass') + 1] if '-pass' in args else None
+for output in outputs:
+    if output == os.devnull:
+        continue
+    total = bitrate('-b:v') + bitrate('-b:a')
+    size = int(total * duration / 8 * (1 + overhead)) if total else 1024
+    with open(output, 'wb') as f:
+        f.write(b'\0' * size)
+
+print("out_time_us=1000000\nspeed=2x\nprogress=end", flush=True)
+if fail_pass and fail_pass == current_pass:
+    print("Generic error in an external library", file=sys.stderr)
+    sys.exit(1)
+sys.exit(0)
+'''
+
+
+def probe_output(duration=60.0):
+    return {
+        'format': {'duration': str(duration), 'format_name': 'matroska'},
+        'streams': [
+            {'index': 0, 'codec_type': 'video', 'codec_name': 'h264',
+             'width': 640, 'height': 360},
+            {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac'},
+        ],
+    }
+
+
+class FakeTools:
+    def __init__(self, duration=60.0):
+        self.root = tempfile.mkdtemp(prefix='mcv_test_')
+        self.bin_dir = os.path.join(self.root, 'bin')
+        self.state_dir = os.path.join(self.root, 'state')
+        os.makedirs(self.bin_dir)
+        os.makedirs(self.state_dir)
+        self._script('ffmpeg', FAKE_FFMPEG)
+        self._script('ffprobe', f"import json\nprint(json.dumps({probe_output(duration)!r}))\n")
+        self.env = {
+            'PATH': self.bin_dir + os.pathsep + os.environ.get('PATH', ''),
+            'FAKE_STATE_DIR': self.state_dir,
+            'FAKE_DURATION': str(duration),
+        }
+
+    def _script(self, name, body):
+        path = os.path.join(self.bin_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n{body}")
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+    def input_file(self, name='input.mkv'):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 4096)
+        return path
+
+    def calls(self):
+        path = os.path.join(self.state_dir, 'calls.jsonl')
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def ffmpeg_pids(self):
+        return [int(name.split('.')[1]) for name in os.listdir(self.state_dir)
+                if name.startswith('ffmpeg.') and name.endswith('.pid')]
+
+
+def process_alive(pid):
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii') as f:
+            # зомби уже мертв, его просто некому забрать
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,58 @@
+import os
+import time
+import threading
+import unittest
+from unittest import mock
+
+from fakes import FakeTools
+
+
+class AutoTuneTest(unittest.TestCase):
+    def setUp(self):
+        self.tools = FakeTools(duration=60.0)
+        patcher = mock.patch.dict(os.environ, self.tools.env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from converter import MediaConverter
+        self.converter = MediaConverter(stall_timeout=1, max_runtime=2)
+        self.input_file = self.tools.input_file()
+        self.output_dir = os.path.join(self.tools.root, 'out')
+
+    def test_stalled_candidate_is_skipped(self):
+        # архивный пресет x264 зависает на пробном кодировании
+        with mock.patch.dict(os.environ, {'FAKE_FFMPEG_SLEEP': '30', 'FAKE_SLOW_ARG': 'slow'}):
+            started = time.monotonic()
+            result = self.converter.convert(self.input_file, 'mp4', self.output_dir, 'video',
+                                            quality=5, realtime=1)
+
+        self.assertTrue(result.success, result.message)
+        self.assertLess(time.monotonic() - started, 10)
+        presets = [call['args'][call['args'].index('-preset') + 1]
+                   for call in self.tools.calls() if '-preset' in call['args']]
+        self.assertEqual(presets[0], 'slow')
+        self.assertEqual(presets[-1], 'medium')
+
+    def test_sampling_does_not_count_against_max_runtime(self):
+        # каждый замер укладывается в лимит, но вместе с кодированием его превышают
+        with mock.patch.dict(os.environ, {'FAKE_FFMPEG_SLEEP': '0.6'}):
+            result = self.converter.convert(self.input_file, 'mp4', self.output_dir, 'video',
+                                            quality=5, realtime=0.01)
+
+        self.assertTrue(result.success, result.message)
+
+    def test_cancel_stops_sampling(self):
+        control = self.converter.new_control()
+        threading.Timer(0.3, control.cancel).start()
+        with mock.patch.dict(os.environ, {'FAKE_FFMPEG_SLEEP': '30'}):
+            started = time.monotonic()
+            result = self.converter.convert(self.input_file, 'mp4', self.output_dir, 'video',
+                                            quality=5, control=control, realtime=1)
+
+        self.assertFalse(result.success)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(len(self.tools.calls()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
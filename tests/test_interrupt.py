@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import signal
+import subprocess
+import unittest
+
+from fakes import FakeTools, SRC_DIR, process_alive
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "нужен /proc")
+class BatchInterruptTest(unittest.TestCase):
+    def test_ctrl_c_stops_ffmpeg(self):
+        tools = FakeTools()
+        inputs = [tools.input_file(f"input{i}.mkv") for i in range(3)]
+        env = dict(os.environ, **tools.env, FAKE_FFMPEG_SLEEP='120')
+
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(SRC_DIR, 'mcv.py'), *inputs, '--format', 'webm',
+             '--quality', '3', '--workers', '2'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 20
+            while len(tools.ffmpeg_pids()) < 2 and time.monotonic() < deadline:
+                time.sleep(0.1)
+            pids = tools.ffmpeg_pids()
+            self.assertEqual(len(pids), 2)
+
+            # терминал шлет SIGINT только группе питона, ffmpeg в своей сессии
+            process.send_signal(signal.SIGINT)
+            process.wait(timeout=15)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        time.sleep(0.5)
+        self.assertEqual([pid for pid in tools.ffmpeg_pids() if process_alive(pid)], [])
+        # третья задача не должна была стартовать после прерывания
+        self.assertEqual(len(tools.ffmpeg_pids()), 2)
+
+    def test_sigterm_stops_ffmpeg(self):
+        tools = FakeTools()
+        env = dict(os.environ, **tools.env, FAKE_FFMPEG_SLEEP='120')
+
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(SRC_DIR, 'mcv.py'), tools.input_file(),
+             '--format', 'webm', '--quality', '3'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 20
+            while not tools.ffmpeg_pids() and time.monotonic() < deadline:
+                time.sleep(0.1)
+            pids = tools.ffmpeg_pids()
+            self.assertEqual(len(pids), 1)
+            process.terminate()
+            process.wait(timeout=15)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        deadline = time.monotonic() + 5
+        while process_alive(pids[0]) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertFalse(process_alive(pids[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
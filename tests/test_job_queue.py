@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import socket
+import threading
+import subprocess
+import unittest
+from unittest import mock
+
+from fakes import FakeTools
+
+
+class RestartAfterCrashTest(unittest.TestCase):
+    def setUp(self):
+        self.tools = FakeTools(duration=10.0)
+        patcher = mock.patch.dict(os.environ, self.tools.env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from database import SettingsDB
+        from converter import MediaConverter
+        self.settings_db = SettingsDB(os.path.join(self.tools.root, 'settings.db'))
+        self.converter = MediaConverter(self.settings_db)
+        self.output_dir = os.path.join(self.tools.root, 'out')
+
+    def dispatcher(self, **kwargs):
+        from job_queue import JobDispatcher
+        return JobDispatcher(self.converter, self.settings_db, max_workers=1,
+                             poll_interval=0.1, **kwargs)
+
+    def crashed_job(self, worker, lease_seconds):
+        job_id = self.dispatcher().submit({'input_file': self.tools.input_file(),
+                                           'output_format': 'mkv',
+                                           'output_path': self.output_dir})
+        # задача осталась в аренде у упавшего процесса
+        job = self.settings_db.claim_job(worker, time.time() + lease_seconds)
+        self.assertEqual(job['id'], job_id)
+        return job_id
+
+    def job_state(self, job_id):
+        return {job['id']: job for job in self.settings_db.get_jobs()}[job_id]['state']
+
+    def test_restart_reclaims_job_of_dead_process(self):
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        job_id = self.crashed_job(f"{socket.gethostname()}:{dead.pid}", lease_seconds=3600)
+
+        started = time.monotonic()
+        self.dispatcher().run(until_idle=True)
+
+        self.assertEqual(self.job_state(job_id), 'done')
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_restart_waits_for_foreign_lease(self):
+        job_id = self.crashed_job("other-host:1", lease_seconds=1.5)
+
+        started = time.monotonic()
+        self.dispatcher().run(until_idle=True)
+
+        self.assertEqual(self.job_state(job_id), 'done')
+        self.assertGreaterEqual(time.monotonic() - started, 1.0)
+
+    def test_stop_returns_job_without_spending_attempt(self):
+        job_id = self.dispatcher().submit({'input_file': self.tools.input_file(),
+                                           'output_format': 'mkv',
+                                           'output_path': self.output_dir}, max_attempts=1)
+        dispatcher = self.dispatcher()
+        with mock.patch.dict(os.environ, {'FAKE_FFMPEG_SLEEP': '120'}):
+            thread = threading.Thread(target=dispatcher.run)
+            thread.start()
+            deadline = time.monotonic() + 20
+            while not self.tools.ffmpeg_pids() and time.monotonic() < deadline:
+                time.sleep(0.1)
+            dispatcher.stop()
+            thread.join(timeout=15)
+
+        self.assertFalse(thread.is_alive())
+        job = {job['id']: job for job in self.settings_db.get_jobs()}[job_id]
+        self.assertEqual((job['state'], job['attempts']), ('queued', 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from fakes import add_src_path
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        add_src_path()
+        from database import SettingsDB
+        from result_cache import ConversionCache
+
+        self.root = tempfile.mkdtemp(prefix='mcv_cache_test_')
+        self.settings_db = SettingsDB(os.path.join(self.root, 'settings.db'))
+        self.settings_db.set_value("use_cache", True)
+        self.cache = ConversionCache(self.settings_db, os.path.join(self.root, 'cache'))
+        self.output_file = os.path.join(self.root, 'out.mp4')
+
+    def write(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_overwriting_output_keeps_artifact(self):
+        self.write(self.output_file, b'original result')
+        self.cache.store('ab' * 20, self.output_file, 1.0)
+        artifact = self.settings_db.get_cache_entry('ab' * 20)['path']
+        self.assertFalse(os.path.samefile(artifact, self.output_file))
+
+        # ffmpeg -y открывает существующий файл на запись и обрезает его
+        with open(self.output_file, 'r+b') as f:
+            f.truncate(0)
+            f.write(b'another encode!')
+        self.assertEqual(self.read(artifact), b'original result')
+
+        other_output = os.path.join(self.root, 'other.mp4')
+        self.assertIsNotNone(self.cache.fetch('ab' * 20, other_output))
+        self.assertEqual(self.read(other_output), b'original result')
+        self.assertFalse(os.path.samefile(artifact, other_output))
+
+    def test_hard_linked_artifact_is_discarded(self):
+        self.write(self.output_file, b'original result')
+        self.cache.store('cd' * 20, self.output_file, 1.0)
+        artifact = self.settings_db.get_cache_entry('cd' * 20)['path']
+        # так артефакты сохранялись раньше
+        os.remove(self.output_file)
+        os.link(artifact, self.output_file)
+
+        self.assertIsNone(self.cache.fetch('cd' * 20, os.path.join(self.root, 'other.mp4')))
+        self.assertIsNone(self.settings_db.get_cache_entry('cd' * 20))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import unittest
+from unittest import mock
+
+from fakes import FakeTools
+
+
+class TargetSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.tools = FakeTools(duration=60.0)
+        patcher = mock.patch.dict(os.environ, self.tools.env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from converter import MediaConverter
+        self.converter = MediaConverter()
+        self.input_file = self.tools.input_file()
+        self.output_dir = os.path.join(self.tools.root, 'out')
+
+    def encode_calls(self):
+        return [call['args'] for call in self.tools.calls() if '-pass' in call['args']]
+
+    def test_passes_share_video_options(self):
+        result = self.converter.convert_video_target(
+            self.input_file, 'mp4', self.output_dir, target_size=3 * 1024 * 1024)
+        self.assertTrue(result.success, result.message)
+
+        first, second = self.encode_calls()
+        first_video = first[first.index('-vsync'):first.index('-an')]
+        start = second.index('-vsync')
+        self.assertEqual(first[first.index('-map'):first.index('-map') + 2], ['-map', '0:V:0?'])
+        self.assertEqual(first_video, second[start:start + len(first_video)])
+
+    def test_result_fits_target_size(self):
+        target = 3 * 1024 * 1024
+        # столько съел контейнер в реальном прогоне, больше заложенных MUXING_OVERHEAD
+        with mock.patch.dict(os.environ, {'FAKE_MUX_OVERHEAD': '0.037'}):
+            result = self.converter.convert_video_target(
+                self.input_file, 'mp4', self.output_dir, target_size=target)
+
+        self.assertTrue(result.success, result.message)
+        size = os.path.getsize(os.path.join(self.output_dir, 'input.mp4'))
+        self.assertLessEqual(size, target)
+        passes = [args[args.index('-pass') + 1] for args in self.encode_calls()]
+        self.assertEqual(passes, ['1', '2', '2'])
+
+    def test_failed_second_pass_is_an_error(self):
+        with mock.patch.dict(os.environ, {'FAKE_FAIL_PASS': '2'}):
+            result = self.converter.convert_video_target(
+                self.input_file, 'mp4', self.output_dir, target_size=3 * 1024 * 1024)
+
+        self.assertFalse(result.success)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'input.mp4')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from fakes import add_src_path
+
+
+class WatchOutputFolderTest(unittest.TestCase):
+    def setUp(self):
+        add_src_path()
+        from database import SettingsDB
+
+        self.root = tempfile.mkdtemp(prefix='mcv_watch_test_')
+        self.settings_db = SettingsDB(os.path.join(self.root, 'settings.db'))
+        self.settings_db.set_value("output_folder", os.path.join(self.root, 'constant'))
+        self.input_file = os.path.join(self.root, 'watched', 'input.mkv')
+
+    def daemon(self):
+        from converter import MediaConverter
+        from watcher import WatchFolderDaemon
+        return WatchFolderDaemon(MediaConverter(self.settings_db), self.settings_db,
+                                 [os.path.dirname(self.input_file)])
+
+    def test_constant_folder_is_used_when_enabled(self):
+        self.settings_db.set_value("use_constant_output", True)
+        self.assertEqual(self.daemon().output_dir_for(self.input_file),
+                         os.path.join(self.root, 'constant'))
+
+    def test_disabled_constant_folder_is_ignored(self):
+        self.settings_db.set_value("use_constant_output", False)
+        self.assertEqual(self.daemon().output_dir_for(self.input_file),
+                         os.path.join(self.root, 'watched', 'converted'))
+
+
+if __name__ == '__main__':
+    unittest.main()